@@ -1,305 +1,36 @@
-import json
 import requests
-from datetime import datetime
-import pytz
 import pytest
-import random
-import string
-import time
+
+from harness import cases, settings
+from harness.race import race_threads
+from harness.token_broker import TokenError
+from harness.validation import ApiResponse
 
 
 class TestSuite:
-    main_url = "https://regions-test.2gis.com"
+    main_url = settings.main_url()
     cookies_token = ""
-    colors = [
-        ("BLUE"),
-        ("GREEN"),
-        ("RED"),
-        ("YELLOW")
-    ]
-    colors_negative = [
-        ("PURPLE"),
-        (""),
-        ("#0000FF")
-    ]
-    titles = [
-        (''.join(random.choice(string.printable) for i in range(1))),
-        (''.join(random.choice(string.printable) for i in range(500))),
-        (''.join(random.choice(string.printable) for i in range(999)))
-    ]
-    lat_available = [
-        (-90.000000),
-        (-50.555555),
-        (-0.000001),
-        (0.000000),
-        (0.000001),
-        (50.555555),
-        (90.000000)
-    ]
-    lon_available = [
-        (-180.000000),
-        (-90.555555),
-        (-0.000001),
-        (0.000000),
-        (0.000001),
-        (90.555555),
-        (180.000000)
-    ]
-    lat_wrong = [
-        (-150),
-        (-90.000001),
-        (-91),
-        (90.000001),
-        (91),
-        (150)
-    ]
-    lon_wrong = [
-        (-200),
-        (-181),
-        (-180.000001),
-        (180.000001),
-        (181),
-        (200)
-    ]
-
-
-    def setup_method(self):
-        mthd = "/v1/auth/tokens"
+    sweep_tolerance = 0.0  # --coord-sweep-tolerance
+    # Every single-request case is a row of harness.cases.TABLE, compiled once at import
+    favorite_cases = [pytest.param(case, id=case.id, marks=[pytest.mark.serial] if case.serial else [])
+                      for case in cases.CASES]
+
+    def setup_method(self, method=None):
+        if method is not None and method.__name__ == "test_favorite_case":
+            return  # a table case takes only the token its row asks for
         try:
-            session = requests.Session()
-            response = session.post(TestSuite.main_url + mthd)
+            self.auth_cookies = self.tokens.acquire()
         except requests.exceptions.ConnectionError:
             assert False, "Connection error by server"
-        else:
-            assert "token" in response.cookies, "There is not token in the response"
-            self.auth_cookies = session.cookies.get_dict()
-            # print(f"\n {mthd}'s cookies: {response.cookies}\n") # The prints like this are used for debugging via -rA key
-
-    def test_set_favorite(self):
-        mthd = "/v1/favorites"
-        title_value = "TestTitle"
-        lat_value = 50.0 # The valid values are between -90 and 90
-        lon_value = 50.0 # The valid values are between -180 and 180
-        color_value = "BLUE"
-        body = {
-            "title": title_value,
-            "lat": lat_value,
-            "lon": lon_value,
-            "color": color_value
-        }
-        try:
-            response = requests.post(TestSuite.main_url + mthd, data=body, cookies=self.auth_cookies)
-        except json.JSONDecodeError:
-            assert False, f"Response is not in JSON format. Response text is '{response.text}'"
-        else:
-            assert response.status_code == 200, f"Unexpected status code {response.status_code}"
-            assert "id" in response.json(), "The 'id' field is missed"
-            assert "title" in response.json(), "The 'title' field is missed"
-            assert "lat" in response.json(), "The 'lat' field is missed"
-            assert "lon" in response.json(), "The 'lon' field is missed"
-            assert "color" in response.json(), "The 'color' field is missed"
-            assert "created_at" in response.json(), "The 'created_at' field is missed" # TODO: create a BaseAssertion Class for this list
-            assert response.json()["id"] > 0, "The 'id' value is less than 0"
-            assert response.json()["title"] == title_value, "The 'title' value is not equal to requests"
-            assert response.json()["lat"] == lat_value, "The 'lat' value is not equal to requests"
-            assert response.json()["lon"] == lon_value, "The 'lon' value is not equal to requests"
-            assert response.json()["color"] == color_value, "The 'color' value is not equal to requests"
-            parsed_time = response.json()["created_at"].rsplit(':', 2)  # Comparison with accuracy to minutes
-            created_at_without_seconds = parsed_time[0]
-            datetime_server = datetime.now(pytz.timezone('Europe/London'))  # Switch to server time from local
-            formatted_date = datetime_server.strftime("%Y-%m-%dT%H:%M")
-            assert created_at_without_seconds == formatted_date, "Unexpected time in 'created_at'" # TODO: To solve a problem of minutes inaccuracy
-            print(f"\n {mthd}'s response: {response.json()}\n")
-
-    def test_set_favorite_without_color(self):
-        mthd = "/v1/favorites"
-        title_value = "TestTitle"
-        lat_value = 50.0  # The valid values are between -90 and 90
-        lon_value = 50.0  # The valid values are between -180 and 180
-        body = {
-            "title": title_value,
-            "lat": lat_value,
-            "lon": lon_value,
-        }
-        response = requests.post(TestSuite.main_url + mthd, data=body, cookies=self.auth_cookies)
-        assert response.status_code == 200, f"Unexpected status code {response.status_code}"
-        assert response.json()["id"] > 0, "The 'id' value is less than 0"
-        assert response.json()["title"] == title_value, "The 'title' value is not equal to requests"
-        assert response.json()["lat"] == lat_value, "The 'lat' value is not equal to requests"
-        assert response.json()["lon"] == lon_value, "The 'lon' value is not equal to requests"
-        assert response.json()["color"] == None, "The 'color' value is not equal to None"
-        print(f"\n {mthd}'s response: {response.json()}\n")
-
-    @pytest.mark.parametrize('color', colors)
-    def test_all_available_colors(self, color):
-        mthd = "/v1/favorites"
-        title_value = "TestTitle"
-        lat_value = 50.0  # The valid values are between -90 and 90
-        lon_value = 50.0  # The valid values are between -180 and 180
-        body = {
-            "title": title_value,
-            "lat": lat_value,
-            "lon": lon_value,
-            "color": color
-        }
-        response = requests.post(TestSuite.main_url + mthd, data=body, cookies=self.auth_cookies)
-        assert response.status_code == 200, f"Unexpected status code {response.status_code}"
-        assert response.json()["id"] > 0, "The 'id' value is less than 0"
-        assert response.json()["title"] == title_value, "The 'title' value is not equal to requests"
-        assert response.json()["lat"] == lat_value, "The 'lat' value is not equal to requests"
-        assert response.json()["lon"] == lon_value, "The 'lon' value is not equal to requests"
-        assert response.json()["color"] == color, "The 'color' value is not equal to requests"
-        print(f"\n {mthd}'s response: {response.json()}\n")
-
-    @pytest.mark.parametrize('title', titles)
-    def test_all_available_titles(self, title):
-        mthd = "/v1/favorites"
-        lat_value = 50.0  # The valid values are between -90 and 90
-        lon_value = 50.0  # The valid values are between -180 and 180
-        body = {
-            "title": title,
-            "lat": lat_value,
-            "lon": lon_value,
-        }
-        response = requests.post(TestSuite.main_url + mthd, data=body, cookies=self.auth_cookies)
-        assert response.status_code == 200, f"Unexpected status code {response.status_code}"
-        assert response.json()["id"] > 0, "The 'id' value is less than 0"
-        assert response.json()["title"] == title, "The 'title' value is not equal to requests"
-        assert response.json()["lat"] == lat_value, "The 'lat' value is not equal to requests"
-        assert response.json()["lon"] == lon_value, "The 'lon' value is not equal to requests"
-        assert response.json()["color"] == None, "The 'color' value is not equal to None"
-        print(f"\n {mthd}'s response: {response.json()}\n")
-
-    @pytest.mark.parametrize('color', colors_negative)
-    def test_negative_colors(self, color):
-        mthd = "/v1/favorites"
-        title_value = "TestTitle"
-        lat_value = 50.0  # The valid values are between -90 and 90
-        lon_value = 50.0  # The valid values are between -180 and 180
-        body = {
-            "title": title_value,
-            "lat": lat_value,
-            "lon": lon_value,
-            "color": color
-        }
-        response = requests.post(TestSuite.main_url + mthd, data=body, cookies=self.auth_cookies)
-        assert response.status_code == 400, f"Unexpected status code {response.status_code}"
-        print(f"\n {mthd}'s response: {response.json()}\n")
-        assert "error" in response.json(), "There is no 'error' for a wrong request"
-        assert "Параметр 'color' может быть одним из следующих значений: BLUE, GREEN, RED, YELLOW" in response.json()['error']['message'], "There is not correct 'message'"
-        # TODO: To figure out negative asserts. For ex: "assert "smth" is not in ...."
+        except TokenError as error:
+            assert False, str(error)
 
-    def test_empty_title(self):
-        mthd = "/v1/favorites"
-        lat_value = 50.0  # The valid values are between -90 and 90
-        lon_value = 50.0  # The valid values are between -180 and 180
-        body = {
-            "title": "",
-            "lat": lat_value,
-            "lon": lon_value,
-        }
-        response = requests.post(TestSuite.main_url + mthd, data=body, cookies=self.auth_cookies)
-        assert response.status_code == 400, f"Unexpected status code {response.status_code}"
-        assert "Параметр 'title' не может быть пустым" in response.json()['error']['message'], "There is not correct 'message'"
-        print(f"\n {mthd}'s response: {response.json()}\n")
-
-    def test_too_large_title(self):
-        mthd = "/v1/favorites"
-        lat_value = 50.0  # The valid values are between -90 and 90
-        lon_value = 50.0  # The valid values are between -180 and 180
-        title = ''.join(random.choice(string.printable) for i in range(1000))
-        body = {
-            "title": title,
-            "lat": lat_value,
-            "lon": lon_value,
-        }
-        response = requests.post(TestSuite.main_url + mthd, data=body, cookies=self.auth_cookies)
-        assert response.status_code == 400, f"Unexpected status code {response.status_code}"
-        assert "Параметр 'title' должен содержать не более 999 символов" in response.json()['error']['message'], "There is not correct 'message'"
-        print(f"\n {mthd}'s response: {response.json()}\n")
-    def test_exceeding_lifetime_of_token(self):
-        mthd = "/v1/favorites"
-        title_value = "TestTitle"
-        lat_value = 50.0  # The valid values are between -90 and 90
-        lon_value = 50.0  # The valid values are between -180 and 180
-        body = {
-            "title": title_value,
-            "lat": lat_value,
-            "lon": lon_value,
-        }
-        time.sleep(2001/1000) # error at 2959 ms
-        response = requests.post(TestSuite.main_url + mthd, data=body, cookies=self.auth_cookies)
-        print(f"\n {mthd}'s response: {response.json()}\n")
-        assert response.status_code == 401, f"Unexpected status code {response.status_code}"
-
-    @pytest.mark.parametrize('lat', lat_available) # TODO: To figure out with exponential format of numbers
-    def test_available_lon(self, lat):
-        mthd = "/v1/favorites"
-        title_value = "TestTitle"
-        lon_value = 50.0  # The valid values are between -180 and 180
-        body = {
-            "title": title_value,
-            "lat": lat,
-            "lon": lon_value,
-        }
-        response = requests.post(TestSuite.main_url + mthd, data=body, cookies=self.auth_cookies)
-        assert response.status_code == 200, f"Unexpected status code {response.status_code}"
-        assert response.json()["lat"] == lat, "The 'lat' value is not equal to requests"
-        print(f"\n {mthd}'s response: {response.json()}\n")
-
-    @pytest.mark.parametrize('lon', lon_available)  # TODO: To figure out with exponential format of numbers
-    def test_available_lat(self, lon):
-        mthd = "/v1/favorites"
-        title_value = "TestTitle"
-        lat_value = 50.0  # The valid values are between -90 and 90
-        body = {
-            "title": title_value,
-            "lat": lat_value,
-            "lon": lon,
-        }
-        response = requests.post(TestSuite.main_url + mthd, data=body, cookies=self.auth_cookies)
-        assert response.status_code == 200, f"Unexpected status code {response.status_code}"
-        assert response.json()["lon"] == lon, "The 'lon' value is not equal to requests"
-        print(f"\n {mthd}'s response: {response.json()}\n")
-
-    @pytest.mark.parametrize('lat', lat_wrong)
-    def test_lat_wrong(self, lat):
-        mthd = "/v1/favorites"
-        title_value = "TestTitle"
-        lon_value = 50.0  # The valid values are between -180 and 180
-        body = {
-            "title": title_value,
-            "lat": lat,
-            "lon": lon_value,
-        }
-        response = requests.post(TestSuite.main_url + mthd, data=body, cookies=self.auth_cookies)
-        assert response.status_code == 400, f"Unexpected status code {response.status_code}"
-        if lat > 0:
-            assert "Параметр 'lat' должен быть не более 90" in response.json()['error']['message'], "There is not correct 'message'"
-        else:
-            assert "Параметр 'lat' должен быть не менее -90" in response.json()['error']['message'], "There is not correct 'message'"
-        print(f"\n {mthd}'s response: {response.json()}\n")
-
-    @pytest.mark.parametrize('lon', lon_wrong)
-    def test_lon_wrong(self, lon):
-        mthd = "/v1/favorites"
-        title_value = "TestTitle"
-        lat_value = 50.0  # The valid values are between -90 and 90
-        body = {
-            "title": title_value,
-            "lat": lat_value,
-            "lon": lon,
-        }
-        response = requests.post(TestSuite.main_url + mthd, data=body, cookies=self.auth_cookies)
-        assert response.status_code == 400, f"Unexpected status code {response.status_code}"
-        if lon > 0:
-            assert "Параметр 'lon' должен быть не более 180" in response.json()['error'][
-                'message'], "There is not correct 'message'"
-        else:
-            assert "Параметр 'lon' должен быть не менее -180" in response.json()['error'][
-                'message'], "There is not correct 'message'"
-        print(f"\n {mthd}'s response: {response.json()}\n")
+    @pytest.mark.parametrize('case', favorite_cases)
+    def test_favorite_case(self, case):
+        problems = case.run(self.client, self.tokens, TestSuite.main_url, self.clock, self.server_clock, self.results)
+        assert not problems, "; ".join(problems)
 
+    @pytest.mark.serial
     def test_several_favorites_per_one_token(self):
         mthd = "/v1/favorites"
         bodies_array = [
@@ -319,74 +50,17 @@ class TestSuite:
                 "lon": 48,
             },
         ]
-        response = requests.post(TestSuite.main_url + mthd, data=bodies_array[0], cookies=self.auth_cookies)
+        response = ApiResponse(self.client.post(TestSuite.main_url + mthd, data=bodies_array[0], cookies=self.auth_cookies))
+        self.results.log(mthd, response)
         assert response.status_code == 200, f"Unexpected status code {response.status_code}"
-        print(f"\n {mthd}'s response: {response.json()}\n")
-        time.sleep(1)
-        response = requests.post(TestSuite.main_url + mthd, data=bodies_array[1], cookies=self.auth_cookies)
+        self.clock.sleep(1)
+        response = ApiResponse(self.client.post(TestSuite.main_url + mthd, data=bodies_array[1], cookies=self.auth_cookies))
+        self.results.log(mthd, response)
         assert response.status_code == 200, f"Unexpected status code {response.status_code}"
-        print(f"\n {mthd}'s response: {response.json()}\n")
-        time.sleep(1)
-        response = requests.post(TestSuite.main_url + mthd, data=bodies_array[2], cookies=self.auth_cookies)
+        self.clock.sleep(1)
+        response = ApiResponse(self.client.post(TestSuite.main_url + mthd, data=bodies_array[2], cookies=self.auth_cookies))
+        self.results.log(mthd, response)
         assert response.status_code == 200, f"Unexpected status code {response.status_code}"
-        print(f"\n {mthd}'s response: {response.json()}\n")
-
-    def test_without_lon(self):
-        mthd = "/v1/favorites"
-        title_value = "TestTitle"
-        lat_value = 50.0  # The valid values are between -90 and 90
-        body = {
-            "title": title_value,
-            "lat": lat_value,
-        }
-        response = requests.post(TestSuite.main_url + mthd, data=body, cookies=self.auth_cookies)
-        assert response.status_code == 400, f"Unexpected status code {response.status_code}"
-        assert "Параметр 'lon' является обязательным" in response.json()['error']['message'], "There is not correct 'message'"
-        print(f"\n {mthd}'s response: {response.json()}\n")
-
-    def test_without_lat(self):
-        mthd = "/v1/favorites"
-        title_value = "TestTitle"
-        lon_value = 50.0  # The valid values are between -90 and 90
-        body = {
-            "title": title_value,
-            "lon": lon_value,
-        }
-        response = requests.post(TestSuite.main_url + mthd, data=body, cookies=self.auth_cookies)
-        assert response.status_code == 400, f"Unexpected status code {response.status_code}"
-        assert "Параметр 'lat' является обязательным" in response.json()['error']['message'], "There is not correct 'message'"
-        print(f"\n {mthd}'s response: {response.json()}\n")
-
-    def test_without_title(self):
-        mthd = "/v1/favorites"
-        lat_value = 50.0  # The valid values are between -90 and 90
-        lon_value = 50.0  # The valid values are between -90 and 90
-        body = {
-            "lon": lon_value,
-            "lat": lat_value
-        }
-        response = requests.post(TestSuite.main_url + mthd, data=body, cookies=self.auth_cookies)
-        print(f"\n {mthd}'s response: {response.json()}\n")
-        assert response.status_code == 400, f"Unexpected status code {response.status_code}"
-        assert "Параметр 'title' является обязательным" in response.json()['error']['message'], "There is not correct 'message'"
-
-    def test_invalid_token(self):
-        mthd = "/v1/favorites"
-        title_value = "TestTitle"
-        lat_value = 50.0  # The valid values are between -90 and 90
-        lon_value = 50.0  # The valid values are between -90 and 90
-        arbitrary_token = {
-            'token': 'absolutelyunrealtoken'
-        }
-        body = {
-            "title": title_value,
-            "lon": lon_value,
-            "lat": lat_value
-        }
-        response = requests.post(TestSuite.main_url + mthd, data=body, cookies=arbitrary_token)
-        print(f"\n {mthd}'s response: {response.json()}\n")
-        assert response.status_code == 401, f"Unexpected status code {response.status_code}"
-        assert "Передан несуществующий или «протухший» 'token'" in response.json()['error']['message'], "There is not correct 'message'"
 
     def test_try_to_id_field_in_requestBody(self):
         mthd = "/v1/favorites"
@@ -400,10 +74,10 @@ class TestSuite:
             "lon": lon_value,
             "lat": lat_value
         }
-        response = requests.post(TestSuite.main_url + mthd, data=body, cookies=self.auth_cookies)
-        print(f"\n {mthd}'s response: {response.json()}\n")
-        assert response.status_code == 200, f"Unexpected status code {response.status_code}"
-        assert response.json()["id"] != id, "There is able to force choose id in response"
+        response = ApiResponse(self.client.post(TestSuite.main_url + mthd, data=body, cookies=self.auth_cookies))
+        self.results.log(mthd, response)
+        response.assert_favorite()
+        assert response.body["id"] != id, "There is able to force choose id in response"
 
     def test_double_set_same_favorite(self):
         mthd = "/v1/favorites"
@@ -415,43 +89,41 @@ class TestSuite:
             "lon": lon_value,
             "lat": lat_value
         }
-        response = requests.post(TestSuite.main_url + mthd, data=body, cookies=self.auth_cookies)
+        response = ApiResponse(self.client.post(TestSuite.main_url + mthd, data=body, cookies=self.auth_cookies))
         assert response.status_code == 200, f"Unexpected status code {response.status_code}"
-        id_from_first_response = response.json()['id']
-        response = requests.post(TestSuite.main_url + mthd, data=body, cookies=self.auth_cookies)
+        id_from_first_response = response.body['id']
+        response = ApiResponse(self.client.post(TestSuite.main_url + mthd, data=body, cookies=self.auth_cookies))
         assert response.status_code == 200, f"Unexpected status code {response.status_code}"
-        assert response.json()['id'] == id_from_first_response, "Idempotence is not performed. Id of the same requests is not similar"
+        assert response.body['id'] == id_from_first_response, "Idempotence is not performed. Id of the same requests is not similar"
         # I'm not sure, that the /favorites should be an idempotent request.
 
-    def test_without_token(self):
-        mthd = "/v1/favorites"
+    def test_parallel_double_set_same_favorite(self):
         title_value = "TestTitle"
         lat_value = 50.0  # The valid values are between -90 and 90
         lon_value = 50.0  # The valid values are between -90 and 90
+        racers = 8
         body = {
             "title": title_value,
             "lon": lon_value,
             "lat": lat_value
         }
-        response = requests.post(TestSuite.main_url + mthd, data=body)
-        print(f"\n {mthd}'s response: {response.json()}\n")
-        assert response.status_code == 401, f"Unexpected status code {response.status_code}"
-        assert "Параметр 'token' является обязательным" in response.json()['error']['message'], "There is not correct 'message'"
-
-    def test_cyrillic_title(self):
-        mthd = "/v1/favorites"
-        title_value = "абвгдеёжзийклмнопрстуфхцчшщъыьэюяАБВГДЕЁЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯ"
-        lat_value = 50.0  # The valid values are between -90 and 90
-        lon_value = 50.0  # The valid values are between -90 and 90
-        body = {
-            "title": title_value,
-            "lon": lon_value,
-            "lat": lat_value
-        }
-        response = requests.post(TestSuite.main_url + mthd, data=body, cookies=self.auth_cookies)
-        print(f"\n {mthd}'s response: {response.json()}\n")
-        assert response.status_code == 200, f"Unexpected status code {response.status_code}"
-        assert response.json()["title"] == title_value, "The 'title' value is not equal to requests"
+        result = race_threads(self.client, TestSuite.main_url, body, self.auth_cookies, racers)
+        assert result.statuses == {"200": racers}, f"Unexpected status codes {dict(result.statuses)}"
+        assert result.duplicates == 0, f"Idempotence is not performed for parallel requests. Ids: {dict(result.ids)}"
+
+    @pytest.mark.sweep
+    @pytest.mark.parametrize('axis', ["lat", "lon"])
+    def test_coordinate_boundary_sweep(self, axis):
+        coord_sweep = pytest.importorskip("harness.coord_sweep")
+        limit = coord_sweep.LIMITS[axis]
+        values, categories = coord_sweep.generate(limit, count=200, boundary_steps=50)
+        sender = coord_sweep.BatchSender(self.client, self.tokens, TestSuite.main_url, axis)
+        try:
+            failures = coord_sweep.sweep(sender, values, categories, limit, report=lambda line: None,
+                                         tolerance=self.sweep_tolerance)
+        finally:
+            sender.close()
+        assert not failures, f"Unexpected {axis} handling: {failures}"
 
     # def test_new_coord_for_existing_title(self):
     #     mthd = "/v1/favorites"
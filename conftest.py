@@ -0,0 +1,139 @@
+import os
+
+import pytest
+
+from harness.fake_server import FakeFavoritesServer
+from harness import cassette, settings
+from harness.clock import RealClock, VirtualClock
+from harness.http_client import HttpClient, POOL_SIZE, TIMEOUT
+from harness.server_clock import LazyServerClock, calibrate
+from harness.token_broker import TokenBroker, TOKEN_LIFETIME
+from harness.token_broker import POOL_SIZE as TOKEN_POOL_SIZE
+
+pytest_plugins = ["harness.timing_plugin", "harness.profiling_plugin", "harness.results_plugin"]
+
+
+def pytest_addoption(parser):
+    parser.addoption("--local-server", action="store_true",
+                     help="Run the suite against an in-process stand-in of the favorites API")
+    parser.addoption("--real-time", action="store_true",
+                     help="Really wait in time-based tests against the stand-in instead of skipping the time")
+    parser.addoption("--pool-size", type=int, default=POOL_SIZE,
+                     help="Maximum number of keep-alive connections kept per host")
+    parser.addoption("--http-timeout", type=float, default=TIMEOUT,
+                     help="Connect and read timeout of every request, in seconds")
+    parser.addoption("--no-keep-alive", action="store_true",
+                     help="Close the connection after every request")
+    parser.addoption("--record", metavar="DIR",
+                     help="Record every request/response pair into a cassette in this directory")
+    parser.addoption("--replay", metavar="DIR",
+                     help="Serve responses from a cassette recorded with --record, without any network")
+    parser.addoption("--token-lifetime", type=float, default=TOKEN_LIFETIME,
+                     help="Seconds a token stays valid after it was issued or last used")
+    parser.addoption("--coord-sweep", action="store_true",
+                     help="Also run the NumPy lat/lon boundary sweep, about 1,200 extra requests")
+    parser.addoption("--coord-sweep-tolerance", type=float, default=0.0,
+                     help="Let the sweep's plain decimal values come back rounded by up to this much")
+    parser.addoption("--token-pool-size", type=int, default=TOKEN_POOL_SIZE,
+                     help="Number of auth tokens minted ahead of time in the background")
+
+
+def pytest_configure(config):
+    # The suite reads FAVORITES_MAIN_URL at import time, so the stand-in has to be up before collection
+    config.addinivalue_line("markers", "serial: moves the shared clock, so it must not overlap other cases")
+    config.addinivalue_line("markers", "sweep: bulk sweep, run only with --coord-sweep")
+    config.fake_server = None
+    config.http_client = None
+    config.token_broker = None
+    config.server_clock = None
+    config.current_test = ""  # id of the running test, which the cassette keys its requests by
+    # The live server only knows real time, a virtual clock makes sense only when both sides share it
+    local = config.getoption("--local-server") and not config.getoption("--replay")
+    config.clock = VirtualClock() if local and not config.getoption("--real-time") else RealClock()
+    if config.getoption("--replay"):
+        # Replayed created_at values and token lifetimes only make sense at the time they were recorded
+        config.clock = VirtualClock(start=cassette.recorded_at(config.getoption("--replay")))
+    if local:
+        config.fake_server = FakeFavoritesServer(token_lifetime=config.getoption("--token-lifetime"),
+                                                 clock=config.clock).start()
+        os.environ["FAVORITES_MAIN_URL"] = config.fake_server.url
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_runtest_setup(item):
+    # Set before the fixtures, so the requests of a test's setup are keyed by it too
+    item.config.current_test = "::".join([item.path.name] + item.nodeid.split("::")[1:])
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--coord-sweep"):
+        return
+    skip = pytest.mark.skip(reason="bulk sweep, run with --coord-sweep")
+    for item in items:
+        if "sweep" in item.keywords:
+            item.add_marker(skip)
+
+
+def pytest_unconfigure(config):
+    if getattr(config, "fake_server", None) is not None:
+        config.fake_server.stop()
+
+
+@pytest.fixture(scope="session")
+def http_client(pytestconfig):
+    client = HttpClient(pool_size=pytestconfig.getoption("--pool-size"),
+                        timeout=pytestconfig.getoption("--http-timeout"),
+                        keep_alive=not pytestconfig.getoption("--no-keep-alive"))
+    cassette.install(client, pytestconfig.getoption("--record"), pytestconfig.getoption("--replay"),
+                     lambda: pytestconfig.current_test)
+    pytestconfig.http_client = client
+    yield client
+    client.close()
+
+
+@pytest.fixture(scope="session")
+def token_broker(pytestconfig, http_client):
+    broker = TokenBroker(http_client, settings.main_url(),
+                         lifetime=pytestconfig.getoption("--token-lifetime"),
+                         pool_size=pytestconfig.getoption("--token-pool-size"),
+                         clock=pytestconfig.clock)
+    pytestconfig.token_broker = broker
+    yield broker.start()
+    broker.stop()
+
+
+@pytest.fixture(scope="session")
+def server_clock(pytestconfig, http_client):
+    # Calibrated on the first created_at check; a replay's Date headers don't follow the clock, so it has none
+    if pytestconfig.getoption("--replay"):
+        pytestconfig.server_clock = LazyServerClock()
+    else:
+        pytestconfig.server_clock = LazyServerClock(lambda: calibrate(http_client, settings.main_url(),
+                                                                      pytestconfig.clock))
+    return pytestconfig.server_clock
+
+
+@pytest.fixture(autouse=True)
+def _bind_harness(request):
+    # Runs before setup_method, so the token is taken from the broker through the shared client.
+    # The harness's own tests are plain functions and start none of it.
+    if request.instance is not None:
+        request.instance.client = request.getfixturevalue("http_client")
+        request.instance.tokens = request.getfixturevalue("token_broker")
+        request.instance.clock = request.config.clock
+        request.instance.results = request.config.result_sink
+        request.instance.server_clock = request.getfixturevalue("server_clock")
+        request.instance.sweep_tolerance = request.config.getoption("--coord-sweep-tolerance")
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    if getattr(config, "http_client", None) is None:
+        return
+    stats = config.http_client.stats.snapshot()
+    terminalreporter.write_sep("-", "http connections")
+    terminalreporter.write_line(f"requests: {stats['requests']}, connections opened: {stats['opened']}, "
+                                f"reused: {stats['reused']}")
+    if config.token_broker is not None:
+        terminalreporter.write_line(f"auth tokens minted: {config.token_broker.minted}")
+    if config.server_clock is not None and config.server_clock.summary():
+        terminalreporter.write_line(config.server_clock.summary())
@@ -0,0 +1,192 @@
+"""Finds the request concurrency /v1/favorites sustains before it degrades.
+
+An AIMD controller adjusts the number of requests in flight once per window:
+while the window is healthy (p90 latency within a tolerance of the best p50
+seen so far and few 429/5xx/transport errors) the limit grows by one,
+otherwise it is halved. The report is the concurrency and throughput of the
+best healthy window.
+
+    python -m harness.adaptive --local-server --server-latency 0.02 --server-workers 8 --duration 20
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+
+from harness import settings
+from harness.bench import BenchResult, send
+from harness.cases import valid_bodies
+from harness.fake_server import add_capacity_arguments, capacity_from_args
+from harness.payloads import FAVORITES_METHOD
+
+WINDOW = 1.0  # seconds
+DURATION = 30.0
+MAX_CONCURRENCY = 64
+LATENCY_TOLERANCE = 2.0  # healthy while p90 <= tolerance * best p50
+ERROR_THRESHOLD = 0.01  # healthy while at most this share of requests are overload errors
+
+
+def is_overload(status):
+    # 4xx other than 429 is a verdict on the body, not on the server's health
+    return status == "429" or status.startswith("5") or not status.isdigit()
+
+
+def overload_errors(window):
+    return sum(count for status, count in window.statuses.items() if is_overload(status))
+
+
+class AimdController:
+    def __init__(self, initial=1, maximum=MAX_CONCURRENCY, latency_tolerance=LATENCY_TOLERANCE,
+                 error_threshold=ERROR_THRESHOLD, decrease=0.5):
+        self.limit = initial
+        self.maximum = maximum
+        self.latency_tolerance = latency_tolerance
+        self.error_threshold = error_threshold
+        self.decrease = decrease
+        self.baseline = None  # best p50 seen, the latency of an unloaded server
+
+    def healthy(self, window):
+        if not window.requests:
+            return False
+        errors = overload_errors(window)
+        p50 = window.histogram.percentile(50)
+        self.baseline = p50 if self.baseline is None else min(self.baseline, p50)
+        return (errors / window.requests <= self.error_threshold
+                and window.histogram.percentile(90) <= self.baseline * self.latency_tolerance)
+
+    def update(self, window):
+        """Takes the finished window and returns whether it was healthy; the new limit is in self.limit."""
+        healthy = self.healthy(window)
+        if healthy:
+            self.limit = min(self.limit + 1, self.maximum)
+        else:
+            self.limit = max(int(self.limit * self.decrease), 1)
+        return healthy
+
+
+class Limiter:
+    """Semaphore whose size can change while threads wait on it."""
+
+    def __init__(self, limit):
+        self.condition = threading.Condition()
+        self.limit = limit
+        self.in_flight = 0
+
+    def resize(self, limit):
+        with self.condition:
+            self.limit = limit
+            self.condition.notify_all()
+
+    def acquire(self, deadline):
+        with self.condition:
+            while self.in_flight >= self.limit:
+                if not self.condition.wait(max(deadline - time.perf_counter(), 0)) and time.perf_counter() >= deadline:
+                    return False
+            self.in_flight += 1
+            return True
+
+    def release(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify()
+
+
+def run_adaptive(client, tokens, main_url, bodies, controller, duration=DURATION, window=WINDOW, report=print):
+    url = main_url + FAVORITES_METHOD
+    limiter = Limiter(controller.limit)
+    lock = threading.Lock()
+    current = [BenchResult("adaptive", controller.limit, None, window)]
+    history = []
+    started = time.perf_counter()
+    deadline = started + duration
+
+    def worker(offset):
+        cookies = tokens.acquire()
+        position = offset
+        while limiter.acquire(deadline):
+            try:
+                if time.perf_counter() >= deadline:
+                    return
+                sent = time.perf_counter()
+                status, cookies = send(client, url, bodies[position % len(bodies)], tokens, cookies)
+                position += 1
+                with lock:
+                    current[0].record(status, time.perf_counter() - sent)
+            finally:
+                limiter.release()
+
+    threads = [threading.Thread(target=worker, args=(index,), name=f"adaptive-{index}", daemon=True)
+               for index in range(controller.maximum)]
+    for thread in threads:
+        thread.start()
+    window_started = started
+    while time.perf_counter() < deadline:
+        time.sleep(min(window, max(deadline - time.perf_counter(), 0)))
+        now = time.perf_counter()
+        with lock:
+            finished, current[0] = current[0], BenchResult("adaptive", controller.limit, None, window)
+        finished.elapsed = now - window_started
+        window_started = now
+        concurrency = controller.limit
+        healthy = controller.update(finished)
+        limiter.resize(controller.limit)
+        row = {
+            "at": now - started,
+            "concurrency": concurrency,
+            "throughput": finished.throughput,
+            "p50": finished.histogram.percentile(50),
+            "p90": finished.histogram.percentile(90),
+            "errors": overload_errors(finished),
+            "requests": finished.requests,
+            "healthy": healthy
+        }
+        history.append(row)
+        report(f"{row['at']:6.1f}s concurrency={concurrency:<4} {row['throughput']:8.1f} req/s "
+               f"p50={row['p50'] * 1000:.1f} ms p90={row['p90'] * 1000:.1f} ms "
+               f"errors={row['errors']} {'healthy' if healthy else 'DEGRADED'}")
+    for thread in threads:
+        thread.join()
+    return history
+
+
+def sustainable(history):
+    """The healthy window with the best throughput, or None if no window was healthy."""
+    healthy = [row for row in history if row["healthy"]]
+    return max(healthy, key=lambda row: row["throughput"]) if healthy else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find the sustainable concurrency of POST /v1/favorites")
+    parser.add_argument("--duration", type=float, default=DURATION)
+    parser.add_argument("--window", type=float, default=WINDOW, help="Seconds between controller updates")
+    parser.add_argument("--max-concurrency", type=int, default=MAX_CONCURRENCY)
+    parser.add_argument("--latency-tolerance", type=float, default=LATENCY_TOLERANCE)
+    parser.add_argument("--error-threshold", type=float, default=ERROR_THRESHOLD)
+    parser.add_argument("--json", dest="json_path", help="Write every window to this file")
+    settings.add_local_server_argument(parser)
+    add_capacity_arguments(parser)
+    args = parser.parse_args()
+
+    bodies = valid_bodies()
+    controller = AimdController(maximum=args.max_concurrency, latency_tolerance=args.latency_tolerance,
+                                error_threshold=args.error_threshold)
+    with settings.local_server(args.local_server, capacity=capacity_from_args(args)), \
+            settings.client_and_tokens(args.max_concurrency,
+                                       pool_size=min(args.max_concurrency, 32)) as (client, tokens):
+        history = run_adaptive(client, tokens, settings.main_url(), bodies, controller, args.duration, args.window)
+
+    best = sustainable(history)
+    if best is None:
+        print("No window was healthy, the server degrades even at concurrency 1")
+    else:
+        print(f"Sustainable: concurrency {best['concurrency']}, {best['throughput']:.1f} req/s, "
+              f"p90 {best['p90'] * 1000:.1f} ms")
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as file:
+            json.dump({"sustainable": best, "windows": history}, file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,182 @@
+"""Throughput and latency benchmark for POST /v1/favorites.
+
+Closed loop (a fixed number of requests in flight):
+    python -m harness.bench --local-server --concurrency 16 --duration 10
+Open loop (a fixed request rate; latency counts from the scheduled send time,
+so a stalled server can't hide its queueing delay):
+    python -m harness.bench --local-server --rate 500 --duration 10 --json bench.json
+"""
+import argparse
+import itertools
+import json
+import sys
+import threading
+import time
+from collections import Counter
+
+from harness import settings
+from harness.cases import valid_bodies
+from harness.corpus import SharedStream, read_corpus
+from harness.histogram import LatencyHistogram
+from harness.payloads import FAVORITES_METHOD
+
+CONCURRENCY = 8
+DURATION = 10.0
+
+
+class BenchResult:
+    def __init__(self, mode, concurrency, rate, duration):
+        self.mode = mode
+        self.concurrency = concurrency
+        self.rate = rate
+        self.duration = duration
+        self.histogram = LatencyHistogram()
+        self.statuses = Counter()  # "200", "400", ... or the exception name for transport failures
+        self.elapsed = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, status, latency):
+        with self.lock:
+            self.statuses[status] += 1
+            self.histogram.record(latency)
+
+    def merge(self, other):
+        self.histogram.merge(other.histogram)
+        self.statuses.update(other.statuses)
+        self.elapsed = max(self.elapsed, other.elapsed)
+        return self
+
+    @property
+    def requests(self):
+        return sum(self.statuses.values())
+
+    @property
+    def errors(self):
+        return sum(count for status, count in self.statuses.items() if status != "200")
+
+    @property
+    def throughput(self):
+        return self.requests / self.elapsed if self.elapsed else 0.0
+
+    def to_dict(self):
+        return {
+            "mode": self.mode,
+            "concurrency": self.concurrency,
+            "rate": self.rate,
+            "duration": self.duration,
+            "elapsed": self.elapsed,
+            "requests": self.requests,
+            "throughput": self.throughput,
+            "statuses": dict(self.statuses),
+            "latency": self.histogram.summary(),
+            "histogram": self.histogram.to_dict()
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        result = cls(data["mode"], data["concurrency"], data["rate"], data["duration"])
+        result.elapsed = data["elapsed"]
+        result.statuses.update(data["statuses"])
+        result.histogram = LatencyHistogram.from_dict(data["histogram"])
+        return result
+
+    def report(self):
+        target = f"{self.rate:g} req/s" if self.rate else f"concurrency {self.concurrency}"
+        lines = [f"{self.requests} requests in {self.elapsed:.2f}s ({target}): {self.throughput:.1f} req/s"]
+        lines.append("statuses: " + ", ".join(f"{status}={count}" for status, count in sorted(self.statuses.items())))
+        latency = self.histogram.summary()
+        lines.append("latency ms: " + ", ".join(f"{name}={latency[name] * 1000:.2f}"
+                                                for name in ("min", "p50", "p90", "p99", "p99.9", "max")))
+        return "\n".join(lines)
+
+
+def post_status(client, url, body, cookies):
+    """One POST. Returns its status as BenchResult counts it, the exception name for a transport failure."""
+    try:
+        return str(client.post(url, data=body, cookies=cookies).status_code)
+    except Exception as error:  # transport failures are part of the error breakdown, not a reason to stop
+        return type(error).__name__
+
+
+def send(client, url, body, tokens, cookies):
+    """One POST, re-acquiring the token when the server has retired it. Returns (status, cookies)."""
+    status = post_status(client, url, body, cookies)
+    if status == "401":
+        cookies = tokens.acquire()
+    return status, cookies
+
+
+def run_bench(client, tokens, main_url, bodies, concurrency=CONCURRENCY, duration=DURATION, rate=None):
+    if not isinstance(bodies, SharedStream) and not bodies:
+        raise ValueError("No bodies to send")
+    result = BenchResult("open" if rate else "closed", concurrency, rate, duration)
+    url = main_url + FAVORITES_METHOD
+    tickets = itertools.count()
+    started = time.perf_counter()
+    deadline = started + duration
+
+    def worker(offset):
+        cookies = tokens.acquire()
+        if isinstance(bodies, SharedStream):
+            payloads = bodies
+        else:
+            payloads = itertools.cycle(bodies[offset % len(bodies):] + bodies[:offset % len(bodies)])
+        while True:
+            if rate:
+                # Open loop: the i-th request is due at started + i / rate, whoever sends it
+                scheduled = started + next(tickets) / rate
+                if scheduled >= deadline:
+                    return
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            else:
+                scheduled = time.perf_counter()
+                if scheduled >= deadline:
+                    return
+            status, cookies = send(client, url, next(payloads), tokens, cookies)
+            result.record(status, time.perf_counter() - scheduled)
+
+    threads = [threading.Thread(target=worker, args=(index,), name=f"bench-{index}", daemon=True)
+               for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark POST /v1/favorites")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY,
+                        help="Requests in flight; with --rate, the number of sending threads")
+    parser.add_argument("--rate", type=float, help="Target requests per second (open loop)")
+    parser.add_argument("--duration", type=float, default=DURATION, help="Seconds to run")
+    parser.add_argument("--json", dest="json_path", help="Write the result, histogram included, to this file")
+    parser.add_argument("--corpus", help="Send the bodies of this corpus file (see harness.corpus) in a loop")
+    parser.add_argument("-k", dest="keyword", help="Only send the accepted bodies of cases whose id contains this")
+    settings.add_local_server_argument(parser)
+    args = parser.parse_args()
+
+    bodies = SharedStream(read_corpus(args.corpus, repeat=True)) if args.corpus else valid_bodies(args.keyword)
+    if not args.corpus and not bodies:
+        parser.error(f"No accepted case id contains {args.keyword!r}")
+    if args.corpus:
+        try:
+            next(read_corpus(args.corpus))  # an empty corpus is refused here, not by every sender thread
+        except ValueError as error:
+            parser.error(str(error))
+    with settings.local_server(args.local_server), \
+            settings.client_and_tokens(args.concurrency, pool_size=min(args.concurrency, 32)) as (client, tokens):
+        result = run_bench(client, tokens, settings.main_url(), bodies, args.concurrency, args.duration, args.rate)
+
+    print(result.report())
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as file:
+            json.dump(result.to_dict(), file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+"""Single-request cases of POST /v1/favorites as one declarative table.
+
+Every row is (id, body overrides, token, expected status, expected fields or
+error substring). The table is compiled once, at import: each row becomes a
+FavoriteCase with its body built and its check chosen, and the suite's
+test_favorite_case, harness.runner and the load tools all take the same
+compiled objects. A new boundary case is one more row.
+
+Overrides are applied to payloads.favorite_body(); ABSENT leaves the field
+out. The token is "valid" (acquired from the broker) or the name of the
+TokenBroker method that makes the cookies: "invalid", "missing", "expired".
+Only valid rows take a token, so the others cost no token at all.
+For a 200 the expected fields default to the echo of the body sent.
+"""
+from collections import namedtuple
+
+import requests
+
+from harness import corpus
+from harness.payloads import FAVORITES_METHOD, favorite_body
+from harness.token_broker import TokenError
+from harness.validation import ApiResponse
+
+VALID, INVALID, MISSING, EXPIRED = "valid", "invalid", "missing", "expired"
+ABSENT = object()
+
+COLORS = ["BLUE", "GREEN", "RED", "YELLOW"]
+COLORS_NEGATIVE = ["PURPLE", "", "#0000FF"]
+TITLES = [corpus.title(1), corpus.title(500), corpus.title(999)]
+LAT_AVAILABLE = [-90.000000, -50.555555, -0.000001, 0.000000, 0.000001, 50.555555, 90.000000]
+LON_AVAILABLE = [-180.000000, -90.555555, -0.000001, 0.000000, 0.000001, 90.555555, 180.000000]
+LAT_WRONG = [-150, -90.000001, -91, 90.000001, 91, 150]
+LON_WRONG = [-200, -181, -180.000001, 180.000001, 181, 200]
+
+COLOR_MESSAGE = "Параметр 'color' может быть одним из следующих значений: BLUE, GREEN, RED, YELLOW"
+EXPIRED_MESSAGE = "Передан несуществующий или «протухший» 'token'"
+
+Row = namedtuple("Row", "id overrides token status expect")
+
+TABLE = [
+    Row("set_favorite", {"color": "BLUE"}, VALID, 200, None),
+    Row("without_color", {}, VALID, 200, None),
+    *(Row(f"color-{color}", {"color": color}, VALID, 200, None) for color in COLORS),
+    *(Row(f"title-{len(title)}", {"title": title}, VALID, 200, None) for title in TITLES),
+    Row("cyrillic_title", {"title": corpus.CYRILLIC}, VALID, 200, None),
+    # Exponent notation, subnormals and -0.0 are left to the opt-in sweep: pytest --coord-sweep
+    *(Row(f"lat-{lat}", {"lat": lat}, VALID, 200, None) for lat in LAT_AVAILABLE),
+    *(Row(f"lon-{lon}", {"lon": lon}, VALID, 200, None) for lon in LON_AVAILABLE),
+    *(Row(f"negative_color-{color or 'empty'}", {"color": color}, VALID, 400, COLOR_MESSAGE)
+      for color in COLORS_NEGATIVE),
+    Row("empty_title", {"title": ""}, VALID, 400, "Параметр 'title' не может быть пустым"),
+    Row("too_large_title", {"title": corpus.title(1000)}, VALID, 400,
+        "Параметр 'title' должен содержать не более 999 символов"),
+    # The same boundary in letters that take two bytes or more in UTF-8
+    *(Row(f"title-{alphabet}-999", {"title": corpus.title(999, alphabet)}, VALID, 200, None)
+      for alphabet in ("cyrillic", "unicode")),
+    *(Row(f"too_large_title-{alphabet}", {"title": corpus.title(1000, alphabet)}, VALID, 400,
+          "Параметр 'title' должен содержать не более 999 символов") for alphabet in ("cyrillic", "unicode")),
+    *(Row(f"lat_wrong-{lat}", {"lat": lat}, VALID, 400,
+          "Параметр 'lat' должен быть не более 90" if lat > 0 else "Параметр 'lat' должен быть не менее -90")
+      for lat in LAT_WRONG),
+    *(Row(f"lon_wrong-{lon}", {"lon": lon}, VALID, 400,
+          "Параметр 'lon' должен быть не более 180" if lon > 0 else "Параметр 'lon' должен быть не менее -180")
+      for lon in LON_WRONG),
+    Row("without_title", {"title": ABSENT}, VALID, 400, "Параметр 'title' является обязательным"),
+    Row("without_lat", {"lat": ABSENT}, VALID, 400, "Параметр 'lat' является обязательным"),
+    Row("without_lon", {"lon": ABSENT}, VALID, 400, "Параметр 'lon' является обязательным"),
+    Row("invalid_token", {}, INVALID, 401, EXPIRED_MESSAGE),
+    Row("without_token", {}, MISSING, 401, "Параметр 'token' является обязательным"),
+    Row("exceeding_lifetime_of_token", {}, EXPIRED, 401, EXPIRED_MESSAGE)
+]
+
+
+class FavoriteCase:
+    def __init__(self, row):
+        self.id = row.id
+        self.method = FAVORITES_METHOD
+        body = favorite_body()
+        body.update(row.overrides)
+        self.body = {name: value for name, value in body.items() if value is not ABSENT}
+        self.token = row.token
+        self.status = row.status
+        self.serial = row.token == EXPIRED  # waiting for the token to expire moves the shared clock
+        if row.status == 200:
+            self.fields = row.expect if row.expect is not None else {
+                "title": self.body.get("title"),
+                "lat": self.body.get("lat"),
+                "lon": self.body.get("lon"),
+                "color": self.body.get("color")
+            }
+            self.message = None
+        else:
+            self.fields = None
+            self.message = row.expect
+
+    def cookies(self, tokens):
+        """Cookies to send: a fresh valid token, else the broker's invalid/missing/expired ones."""
+        return tokens.acquire() if self.token == VALID else getattr(tokens, self.token)()
+
+    @property
+    def checks_created_at(self):
+        return self.status == 200
+
+    def run(self, client, tokens, main_url, clock, server_clock, results):
+        """Sends the case and returns its problems; an accepted one also has created_at checked."""
+        # Reported as setup_method reports them for the other tests
+        try:
+            cookies = self.cookies(tokens)
+            sent = clock.time()
+            response = ApiResponse(client.post(main_url + self.method, data=self.body, cookies=cookies))
+            received = clock.time()
+        except requests.exceptions.ConnectionError:
+            return ["Connection error by server"]
+        except TokenError as error:
+            return [str(error)]
+        results.log(self.method, response)
+        problems = self.problems(response)
+        if self.checks_created_at and not problems:
+            # The server clock offset is calibrated once, on the first check, so created_at is checked to the second
+            problems = server_clock.window_problems(response.body["created_at"], sent, received)
+        return problems
+
+    def problems(self, response):
+        if self.fields is not None:
+            return response.favorite_problems(self.status, **self.fields)
+        if self.message is not None:
+            return response.error_problems(self.status, self.message)
+        return [] if response.status_code == self.status else [f"Unexpected status code {response.status_code}"]
+
+    def __repr__(self):
+        return f"FavoriteCase({self.id})"
+
+
+def compile_table(table):
+    ids = [row.id for row in table]
+    duplicates = {case_id for case_id in ids if ids.count(case_id) > 1}
+    if duplicates:
+        raise ValueError(f"Duplicate case ids: {sorted(duplicates)}")
+    return [FavoriteCase(row) for row in table]
+
+
+CASES = compile_table(TABLE)
+
+
+def valid_bodies(keyword=None, cases=CASES):
+    """Bodies of every case the server should accept under a valid token, for the load tools."""
+    return [case.body for case in cases
+            if case.status == 200 and case.token == VALID and (keyword is None or keyword in case.id)]
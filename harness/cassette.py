@@ -0,0 +1,238 @@
+"""Record/replay store for the suite's HTTP conversation.
+
+--record DIR captures every request/response pair, including the token flow,
+and --replay DIR serves them back without touching the network.
+
+A cassette is two files. cassette.dat holds the responses back to back, and
+cassette.idx is a sorted array of fixed-size entries (key digest, occurrence,
+offset, length). Both are memory-mapped on replay and looked up with a binary
+search, so a recording of any size opens instantly and only the responses
+actually asked for are decoded.
+
+Requests are keyed by the test that sent them, method, path, sorted form
+fields and the kind of token they carry (none, one the server issued in this
+conversation, or an unknown one), not by the token value, which is different
+on every run. Identical keys are told apart by their occurrence number, so
+within a test a replay has to repeat the recorded order of requests, but any
+subset of the recorded tests can be replayed (-k). Token requests belong to no
+test: the broker mints them in the background, and any issued token will do,
+so when a replay asks for more of them than were recorded the last answer is
+repeated. Any other request that was not recorded raises CassetteMiss.
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from datetime import timedelta
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qsl, urlsplit
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+from harness.token_broker import AUTH_METHOD
+
+MAGIC = b"FAVCAS02"
+HEADER = struct.Struct("<8sQd")  # magic, number of entries, unix time the recording started
+ENTRY = struct.Struct("<16sIQI")  # key digest, occurrence, offset in cassette.dat, length
+RESPONSE_HEADER = struct.Struct("<I")  # length of the JSON status line and headers that precede the body
+DATA_FILE = "cassette.dat"
+INDEX_FILE = "cassette.idx"
+
+
+class CassetteMiss(requests.exceptions.ConnectionError):
+    pass
+
+
+class TokenClassifier:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.issued = set()
+
+    def learn(self, headers):
+        cookie = SimpleCookie()
+        for name, value in headers:
+            if name.lower() == "set-cookie":
+                cookie.load(value)
+        if "token" in cookie:
+            with self.lock:
+                self.issued.add(cookie["token"].value)
+
+    def classify(self, cookie_header):
+        cookie = SimpleCookie(cookie_header or "")
+        if "token" not in cookie:
+            return "none"
+        return "issued" if cookie["token"].value in self.issued else "unknown"
+
+
+def request_key(request, token_kind, test=""):
+    body = request.body or ""
+    if isinstance(body, bytes):
+        body = body.decode("utf-8")
+    fields = sorted(parse_qsl(body, keep_blank_values=True))
+    key = json.dumps([test, request.method, urlsplit(request.url).path, fields, token_kind], ensure_ascii=False)
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+
+
+class CassetteWriter:
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.data = open(os.path.join(directory, DATA_FILE), "wb")
+        self.entries = []
+        self.occurrences = {}
+        self.started = time.time()
+        self.lock = threading.Lock()
+
+    def add(self, digest, status, reason, headers, body):
+        meta = json.dumps({"status": status, "reason": reason, "headers": headers}, ensure_ascii=False).encode("utf-8")
+        record = RESPONSE_HEADER.pack(len(meta)) + meta + body
+        with self.lock:
+            occurrence = self.occurrences.get(digest, 0)
+            self.occurrences[digest] = occurrence + 1
+            self.entries.append((digest, occurrence, self.data.tell(), len(record)))
+            self.data.write(record)
+
+    def close(self):
+        self.data.close()
+        self.entries.sort()
+        with open(os.path.join(self.directory, INDEX_FILE), "wb") as index:
+            index.write(HEADER.pack(MAGIC, len(self.entries), self.started))
+            for entry in self.entries:
+                index.write(ENTRY.pack(*entry))
+
+
+class CassetteReader:
+    def __init__(self, directory):
+        self.files = [open(os.path.join(directory, name), "rb") for name in (INDEX_FILE, DATA_FILE)]
+        self.index = mmap.mmap(self.files[0].fileno(), 0, access=mmap.ACCESS_READ)
+        data_size = os.fstat(self.files[1].fileno()).st_size
+        self.data = mmap.mmap(self.files[1].fileno(), 0, access=mmap.ACCESS_READ) if data_size else b""
+        magic, self.count, self.started = HEADER.unpack_from(self.index, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{directory} is not a cassette")
+        self.occurrences = {}
+        self.lock = threading.Lock()
+
+    def entry(self, position):
+        return ENTRY.unpack_from(self.index, HEADER.size + position * ENTRY.size)
+
+    def find(self, digest, occurrence, repeat_last=False):
+        """Position of the entry; with repeat_last, of the digest's last occurrence if this one was never recorded."""
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.entry(middle)[:2] < (digest, occurrence):
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count and self.entry(low)[:2] == (digest, occurrence):
+            return low
+        # A replay may ask for more tokens than the recording minted; repeat the last answer
+        if repeat_last and low > 0 and self.entry(low - 1)[0] == digest:
+            return low - 1
+        return None
+
+    def next_response(self, digest, repeat_last=False):
+        with self.lock:
+            occurrence = self.occurrences.get(digest, 0)
+            self.occurrences[digest] = occurrence + 1
+        position = self.find(digest, occurrence, repeat_last)
+        if position is None:
+            return None
+        _, _, offset, length = self.entry(position)
+        meta_length, = RESPONSE_HEADER.unpack_from(self.data, offset)
+        meta_end = offset + RESPONSE_HEADER.size + meta_length
+        meta = json.loads(self.data[offset + RESPONSE_HEADER.size:meta_end])
+        return meta, self.data[meta_end:offset + length]
+
+    def close(self):
+        self.index.close()
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        for file in self.files:
+            file.close()
+
+
+class CassetteAdapter(BaseAdapter):
+    """Sits in front of the real adapter: records through it, or replays without it."""
+
+    def __init__(self, adapter, writer=None, reader=None, current_test=None):
+        super().__init__()
+        self.adapter = adapter
+        self.writer = writer
+        self.reader = reader
+        self.current_test = current_test or (lambda: "")  # id of the running test, the requests' scope
+        self.tokens = TokenClassifier()
+
+    def send(self, request, **kwargs):
+        token_request = urlsplit(request.url).path == AUTH_METHOD
+        digest = request_key(request, self.tokens.classify(request.headers.get("Cookie")),
+                             "" if token_request else self.current_test())
+        if self.reader is not None:
+            return self.replay(request, digest, token_request)
+        response = self.adapter.send(request, **kwargs)
+        headers = list(response.raw.headers.items())
+        self.tokens.learn(headers)
+        self.writer.add(digest, response.status_code, response.reason, headers, response.content)
+        return response
+
+    def replay(self, request, digest, token_request=False):
+        recorded = self.reader.next_response(digest, repeat_last=token_request)
+        if recorded is None:
+            raise CassetteMiss(f"{request.method} {request.url} was not recorded in {self.current_test() or 'this run'}",
+                               request=request)
+        meta, body = recorded
+        self.tokens.learn(meta["headers"])
+        response = requests.Response()
+        response.status_code = meta["status"]
+        response.reason = meta["reason"]
+        response.headers = CaseInsensitiveDict()
+        for name, value in meta["headers"]:
+            if name.lower() == "set-cookie":
+                for morsel in SimpleCookie(value).values():
+                    response.cookies.set(morsel.key, morsel.value)
+            response.headers[name] = value if name not in response.headers else f"{response.headers[name]}, {value}"
+        response._content = bytes(body)
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        response.elapsed = timedelta(0)
+        return response
+
+    def close(self):
+        # The same adapter is mounted for both schemes, so the session closes it twice
+        self.adapter.close()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+
+
+def recorded_at(directory):
+    with open(os.path.join(directory, INDEX_FILE), "rb") as index:
+        magic, _, started = HEADER.unpack(index.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError(f"{directory} is not a cassette")
+    return started
+
+
+def install(client, record=None, replay=None, current_test=None):
+    """Puts a cassette in front of the client's adapters. Returns it, or None when neither mode is asked for.
+
+    current_test() names the running test, so each test replays its own requests.
+    """
+    if not record and not replay:
+        return None
+    writer = CassetteWriter(record) if record else None
+    reader = CassetteReader(replay) if replay else None
+    adapter = CassetteAdapter(client.session.get_adapter("https://"), writer, reader, current_test)
+    client.session.mount("http://", adapter)
+    client.session.mount("https://", adapter)
+    return adapter
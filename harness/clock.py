@@ -0,0 +1,41 @@
+"""Clocks shared by the suite, the token broker and the local stand-in server.
+
+RealClock is plain wall-clock time and is the only choice against the live server.
+VirtualClock follows real time too, but sleep() moves it forward instantly instead
+of blocking, so expiry and spacing scenarios against the stand-in take no time.
+"""
+import threading
+import time
+
+
+class RealClock:
+    def time(self):
+        return time.time()
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+class VirtualClock:
+    def __init__(self, start=None):
+        self.lock = threading.Lock()
+        # Seconds skipped by sleep() so far; a start time in the past replays a recorded run at its own time
+        self.offset = 0.0 if start is None else start - time.time()
+
+    def time(self):
+        return time.time() + self.offset
+
+    def monotonic(self):
+        return time.monotonic() + self.offset
+
+    def sleep(self, seconds):
+        self.advance(seconds)
+
+    def advance(self, seconds):
+        if seconds < 0:
+            raise ValueError("The clock can't go backwards")
+        with self.lock:
+            self.offset += seconds
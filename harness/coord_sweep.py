@@ -0,0 +1,196 @@
+"""Bulk lat/lon boundary sweep, generated and verified with NumPy.
+
+The suite's lat/lon matrices are a handful of hand-picked floats. The sweep
+generates values in bulk around +-90/+-180 (in 1e-6 steps and in single ulps),
+subnormals, negative zero, random values with 6 to 15 decimals, and the same
+kinds of values written in exponent notation. It sends them in batches and
+checks, one batch at a time as whole arrays, that the server accepts exactly
+the values within the limits and that the echoed number round-trips bit for
+bit, sign of zero included, as the suite's table cases require. --tolerance
+lets the plain decimal values (not the subnormal, negative-zero or exponent
+ones, whose whole point is the exact value) come back rounded by up to that
+much. Failures are reported as value ranges.
+
+    python -m harness.coord_sweep --local-server --axis lat --count 1000000 --concurrency 32
+
+In the suite the sweep is opt-in: pytest --coord-sweep.
+"""
+import argparse
+import json
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+from harness import settings
+from harness.payloads import FAVORITES_METHOD, favorite_body
+
+LIMITS = {"lat": 90.0, "lon": 180.0}
+CATEGORIES = ("boundary-micro", "boundary-ulp", "subnormal", "negative-zero", "decimals", "exponent")
+BOUNDARY_STEPS = 1000  # values on each side of each limit, in 1e-6 steps and in ulps
+BATCH = 4096
+CONCURRENCY = 16
+SEED = 20230720
+# Categories an echo may differ in by --tolerance; the others only make sense compared bit for bit
+ROUNDABLE = ("boundary-micro", "boundary-ulp", "decimals")
+
+
+def generate(limit, count, seed=SEED, boundary_steps=BOUNDARY_STEPS):
+    """(values, categories): float64 values to send and the index in CATEGORIES each one was made by.
+
+    count random values are added to the fixed neighbourhoods of the limits and the two zeros.
+    """
+    rng = np.random.default_rng(seed)
+    steps = np.arange(-boundary_steps, boundary_steps + 1)
+    edges = np.array([-limit, limit], dtype=np.float64)
+    micro = (edges[:, None] + steps * 1e-6).ravel()
+    # Neighbouring floats differ by one in their bit pattern, so ulp steps are integer steps of the int64 view
+    ulp = (edges.view(np.int64)[:, None] + steps).ravel().view(np.float64)
+    mantissas = rng.integers(1, 2 ** 52, size=max(count // 16, 1), dtype=np.int64)
+    subnormal = mantissas.view(np.float64) * rng.choice([-1.0, 1.0], size=mantissas.size)
+    fixed = [micro, ulp, subnormal, np.array([-0.0, 0.0])]
+    rest = max(count - subnormal.size, 2)
+    scale = 10.0 ** rng.integers(6, 16, rest // 2)
+    decimals = np.round(rng.uniform(-1.2 * limit, 1.2 * limit, rest // 2) * scale) / scale
+    exponent = rng.uniform(-1.2 * limit, 1.2 * limit, rest - rest // 2)
+    parts = fixed + [decimals, exponent]
+    values = np.concatenate(parts)
+    categories = np.concatenate([np.full(part.size, index, dtype=np.int8) for index, part in enumerate(parts)])
+    return values, categories
+
+
+def format_values(values, categories):
+    """Shortest round-trip text, or exponent notation for the exponent category."""
+    texts = values.astype(str).astype(object)
+    exponent = categories == CATEGORIES.index("exponent")
+    texts[exponent] = np.char.mod("%.17e", values[exponent]).astype(object)
+    return texts
+
+
+class BatchSender:
+    def __init__(self, client, tokens, main_url, axis, concurrency=CONCURRENCY):
+        self.client = client
+        self.tokens = tokens
+        self.url = main_url + FAVORITES_METHOD
+        self.axis = axis
+        self.local = threading.local()
+        self.pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="sweep")
+
+    def send_one(self, text):
+        cookies = getattr(self.local, "cookies", None) or self.tokens.acquire()
+        body = favorite_body(title="Sweep")
+        body[self.axis] = text
+        for _ in range(2):  # a second try when the token has just expired
+            try:
+                response = self.client.post(self.url, data=body, cookies=cookies)
+            except requests.exceptions.RequestException:
+                return 0, np.nan
+            if response.status_code != 401:
+                break
+            cookies = self.tokens.acquire()
+        self.local.cookies = cookies
+        if response.status_code != 200:
+            return response.status_code, np.nan
+        return 200, float(response.json()[self.axis])
+
+    def send(self, texts):
+        """(statuses, echoed values) for one batch; status 0 marks a transport failure."""
+        results = list(self.pool.map(self.send_one, texts))
+        statuses = np.fromiter((status for status, _ in results), dtype=np.int16, count=len(results))
+        echoed = np.fromiter((value for _, value in results), dtype=np.float64, count=len(results))
+        return statuses, echoed
+
+    def close(self):
+        self.pool.shutdown()
+
+
+def verify(values, categories, statuses, echoed, limit, tolerance=0.0):
+    """Boolean masks of the failures in one batch, by kind."""
+    expected = (values >= -limit) & (values <= limit)
+    accepted = statuses == 200
+    answered = (statuses == 200) | (statuses == 400)
+    failures = {
+        "rejected a valid value": expected & (statuses == 400),
+        "accepted an invalid value": ~expected & accepted,
+        "unexpected status": ~answered
+    }
+    equal = echoed == values
+    if tolerance:
+        roundable = np.isin(categories, [CATEGORIES.index(category) for category in ROUNDABLE])
+        equal |= roundable & (np.abs(echoed - values) <= tolerance)
+    failures["echo does not round-trip"] = accepted & ~equal
+    failures["sign of zero lost"] = accepted & equal & (values == 0) & (np.signbit(echoed) != np.signbit(values))
+    return failures
+
+
+def to_ranges(values, failed, categories, limit=20):
+    """Collapses failures into [low, high] runs of neighbouring failed values, per category."""
+    ranges = []
+    for index, category in enumerate(CATEGORIES):
+        in_category = categories == index
+        order = np.argsort(values[in_category], kind="stable")
+        sorted_values = values[in_category][order]
+        sorted_failed = failed[in_category][order]
+        if not sorted_failed.any():
+            continue
+        edges = np.diff(np.concatenate([[0], sorted_failed.astype(np.int8), [0]]))
+        starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+        for start, end in zip(starts, ends):
+            ranges.append({"category": category, "low": float(sorted_values[start]),
+                           "high": float(sorted_values[end - 1]), "count": int(end - start)})
+    return sorted(ranges, key=lambda item: item["count"], reverse=True)[:limit]
+
+
+def sweep(sender, values, categories, limit, batch=BATCH, report=print, tolerance=0.0):
+    """Sends every value and returns the failures by kind: how many, and the largest ranges."""
+    failures = {}
+    for start in range(0, values.size, batch):
+        chunk = slice(start, start + batch)
+        statuses, echoed = sender.send(format_values(values[chunk], categories[chunk]))
+        for kind, mask in verify(values[chunk], categories[chunk], statuses, echoed, limit, tolerance).items():
+            failures.setdefault(kind, []).append(mask)
+        report(f"{min(start + batch, values.size)}/{values.size} sent")
+    failures = {kind: np.concatenate(masks) for kind, masks in failures.items()}
+    return {kind: {"count": int(mask.sum()), "ranges": to_ranges(values, mask, categories)}
+            for kind, mask in failures.items() if mask.any()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep lat/lon boundaries of POST /v1/favorites")
+    parser.add_argument("--axis", choices=sorted(LIMITS), default="lat")
+    parser.add_argument("--count", type=int, default=100000, help="Random values to send besides the limits' neighbourhoods")
+    parser.add_argument("--batch", type=int, default=BATCH)
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--tolerance", type=float, default=0.0,
+                        help="Let plain decimal values come back rounded by up to this much")
+    parser.add_argument("--json", dest="json_path", help="Write the failure ranges to this file")
+    settings.add_local_server_argument(parser)
+    args = parser.parse_args()
+
+    limit = LIMITS[args.axis]
+    values, categories = generate(limit, args.count, args.seed)
+    with settings.local_server(args.local_server), \
+            settings.client_and_tokens(args.concurrency, pool_size=min(args.concurrency, 32)) as (client, tokens):
+        sender = BatchSender(client, tokens, settings.main_url(), args.axis, args.concurrency)
+        try:
+            failures = sweep(sender, values, categories, limit, args.batch, tolerance=args.tolerance)
+        finally:
+            sender.close()
+
+    if not failures:
+        print(f"All {values.size} {args.axis} values behaved as expected")
+    for kind, failure in failures.items():
+        print(f"{kind}: {failure['count']} values")
+        for item in failure["ranges"]:
+            print(f"    {item['category']}: [{item['low']!r}, {item['high']!r}] x{item['count']}")
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as file:
+            json.dump(failures, file, indent=2)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""Seeded favorite titles and bodies, generated in bulk and streamed.
+
+Every title is drawn in one call from a Random seeded by (seed, alphabet,
+length), so the same arguments give the same title on every run and in every
+process. stream_bodies() yields bodies lazily and write_corpus()/read_corpus()
+keep them in an NDJSON file read line by line, so a load or fuzz run over
+millions of favorites holds one body at a time.
+
+    python -m harness.corpus --count 1000000 --out corpus.ndjson
+    python -m harness.bench --local-server --corpus corpus.ndjson
+"""
+import argparse
+import itertools
+import json
+import random
+import string
+import sys
+import threading
+
+from harness.payloads import favorite_body
+
+SEED = 2023
+CYRILLIC = "абвгдеёжзийклмнопрстуфхцчшщъыьэюяАБВГДЕЁЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯ"  # as in the cyrillic_title case
+ALPHABETS = {
+    "printable": string.printable,
+    "cyrillic": CYRILLIC,
+    # Latin with diacritics, Greek, CJK and Arabic. Nothing outside the BMP: it is not known whether the server
+    # counts the 999 characters in code points or UTF-16 units, and only there the two differ, so a "valid" title
+    # of such characters could be rejected as too long
+    "unicode": string.ascii_letters + string.digits + CYRILLIC + "çéñøßüÆŒ" + "αβγδΩ" + "中文标题収藏" + "عربي"
+}
+LAT_LIMIT = 90.0
+LON_LIMIT = 180.0
+
+
+def title(length, alphabet="printable", seed=SEED):
+    rng = random.Random(f"{seed}:{alphabet}:{length}")
+    return "".join(rng.choices(ALPHABETS[alphabet], k=length))
+
+
+def stream_bodies(count=None, seed=SEED, alphabets=tuple(ALPHABETS), max_length=999):
+    """Yields count valid bodies (forever if count is None): random alphabet, length, coordinates and color."""
+    rng = random.Random(seed)
+    colors = (None, "BLUE", "GREEN", "RED", "YELLOW")
+    for _ in range(count) if count is not None else itertools.count():
+        alphabet = ALPHABETS[rng.choice(alphabets)]
+        yield favorite_body(title="".join(rng.choices(alphabet, k=rng.randint(1, max_length))),
+                            lat=round(rng.uniform(-LAT_LIMIT, LAT_LIMIT), 6),
+                            lon=round(rng.uniform(-LON_LIMIT, LON_LIMIT), 6),
+                            color=rng.choice(colors))
+
+
+def write_corpus(path, bodies):
+    """Writes bodies one JSON object per line and returns how many were written."""
+    written = 0
+    with open(path, "w", encoding="utf-8") as file:
+        for body in bodies:
+            file.write(json.dumps(body, ensure_ascii=False) + "\n")
+            written += 1
+    return written
+
+
+def read_corpus(path, repeat=False):
+    """Yields the bodies of a corpus file line by line; with repeat, starts over at the end."""
+    while True:
+        read = 0
+        with open(path, encoding="utf-8") as file:
+            for line in file:
+                if line.strip():
+                    read += 1
+                    yield json.loads(line)
+        if not read:
+            # Starting over would reopen the file forever, with a SharedStream holding its lock all along
+            raise ValueError(f"{path} holds no bodies")
+        if not repeat:
+            return
+
+
+class SharedStream:
+    """Lets several sending threads take bodies from one lazy stream."""
+
+    def __init__(self, bodies):
+        self.bodies = iter(bodies)
+        self.lock = threading.Lock()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        with self.lock:
+            return next(self.bodies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a seeded corpus of POST /v1/favorites bodies")
+    parser.add_argument("--count", type=int, required=True)
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--alphabet", action="append", choices=sorted(ALPHABETS),
+                        help="Title alphabet, repeatable; all of them by default")
+    parser.add_argument("--out", required=True, help="NDJSON file to write")
+    args = parser.parse_args()
+    alphabets = tuple(args.alphabet or ALPHABETS)
+    written = write_corpus(args.out, stream_bodies(args.count, args.seed, alphabets))
+    print(f"Wrote {written} bodies to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
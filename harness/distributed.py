@@ -0,0 +1,209 @@
+"""Benchmark load spread over worker processes, on one host or several.
+
+One Python process can't drive POST /v1/favorites hard: every request holds
+the GIL while it is built and parsed. The coordinator splits the concurrency
+(and the rate, in open-loop mode) of a bench run between workers, starts them
+all at once and merges the latency histograms and status counts they send
+back into one report. Coordinator and workers talk over plain TCP with
+length-prefixed JSON frames.
+
+On one box, with the coordinator spawning its own workers:
+    python -m harness.distributed coordinator --local-server --spawn 4 --concurrency 32 --duration 10
+Across hosts, start the coordinator, then one or more workers on each load host:
+    python -m harness.distributed coordinator --listen 0.0.0.0:7700 --workers 8 --rate 4000
+    python -m harness.distributed worker --connect coordinator-host:7700
+"""
+import argparse
+import json
+import os
+import socket
+import struct
+import subprocess
+import sys
+import time
+
+from harness import settings
+from harness.bench import BenchResult, CONCURRENCY, DURATION, run_bench
+from harness.cases import valid_bodies
+from harness.corpus import SharedStream, read_corpus
+
+FRAME = struct.Struct("!I")  # length of the JSON frame that follows
+PORT = 7700
+CONNECT_TIMEOUT = 30.0  # seconds a worker keeps retrying, and the coordinator waits, for the other side
+RESULT_GRACE = 30.0  # seconds past the run's duration the coordinator waits for results
+
+
+def send_frame(sock, message):
+    payload = json.dumps(message).encode("utf-8")
+    sock.sendall(FRAME.pack(len(payload)) + payload)
+
+
+def receive_frame(sock):
+    header = receive_exactly(sock, FRAME.size)
+    length, = FRAME.unpack(header)
+    return json.loads(receive_exactly(sock, length))
+
+
+def receive_exactly(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            raise ConnectionError("The other side closed the connection")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def split(total, parts):
+    """Splits an integer as evenly as possible: split(10, 4) == [3, 3, 2, 2]."""
+    return [total // parts + (index < total % parts) for index in range(parts)]
+
+
+def jobs(workers, main_url, concurrency, duration, rate=None, corpus=None):
+    if concurrency < workers:
+        # Every worker runs at least one thread, so fewer would silently run more concurrency than asked for
+        raise ValueError(f"Concurrency {concurrency} is less than the {workers} workers")
+    shares = split(concurrency, workers)
+    return [{
+        "main_url": main_url,
+        "concurrency": share,
+        "rate": rate / workers if rate else None,
+        "duration": duration,
+        "corpus": corpus,
+        "offset": index
+    } for index, share in enumerate(shares)]
+
+
+def run_worker(address):
+    """Connects to the coordinator, runs the job it sends and returns the result sent back."""
+    deadline = time.monotonic() + CONNECT_TIMEOUT
+    while True:
+        try:
+            sock = socket.create_connection(address)
+            break
+        except OSError:
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(0.2)
+    with sock:
+        job = receive_frame(sock)
+        if job["corpus"]:
+            bodies = SharedStream(read_corpus(job["corpus"], repeat=True))
+        else:
+            bodies = valid_bodies()
+            # Workers start on different bodies, as the threads of one bench do
+            bodies = bodies[job["offset"] % len(bodies):] + bodies[:job["offset"] % len(bodies)]
+        with settings.client_and_tokens(job["concurrency"], job["main_url"],
+                                        pool_size=min(job["concurrency"], 32)) as (client, tokens):
+            send_frame(sock, {"ready": True})
+            receive_frame(sock)  # the go signal, once every worker is ready
+            result = run_bench(client, tokens, job["main_url"], bodies, job["concurrency"], job["duration"],
+                               job["rate"])
+        send_frame(sock, {"result": result.to_dict(), "host": socket.gethostname(), "pid": os.getpid()})
+        return result
+
+
+def coordinate(listener, job_list, report=print):
+    """Hands one job to each worker that connects, starts them together and merges their results.
+
+    Returns (merged BenchResult, per-worker rows); a worker that drops out is reported and left out.
+    """
+    listener.settimeout(CONNECT_TIMEOUT)
+    connections = []
+    try:
+        for job in job_list:
+            sock, peer = listener.accept()
+            sock.settimeout(CONNECT_TIMEOUT)
+            connections.append((sock, peer))
+            send_frame(sock, job)
+        for sock, _ in connections:
+            receive_frame(sock)
+        report(f"{len(connections)} workers ready, starting")
+        for sock, _ in connections:
+            sock.settimeout(job_list[0]["duration"] + RESULT_GRACE)
+            send_frame(sock, {"go": True})
+
+        first = job_list[0]
+        merged = BenchResult("open" if first["rate"] else "closed", sum(job["concurrency"] for job in job_list),
+                             sum(job["rate"] for job in job_list) if first["rate"] else None, first["duration"])
+        rows = []
+        for sock, peer in connections:
+            try:
+                message = receive_frame(sock)
+            except (OSError, ConnectionError, ValueError) as error:
+                report(f"worker {peer[0]}:{peer[1]} dropped out: {error}")
+                rows.append({"worker": f"{peer[0]}:{peer[1]}", "error": str(error)})
+                continue
+            result = BenchResult.from_dict(message["result"])
+            merged.merge(result)
+            rows.append({"worker": f"{message['host']}/{message['pid']}", "requests": result.requests,
+                         "throughput": result.throughput, "p99": result.histogram.percentile(99)})
+        return merged, rows
+    finally:
+        for sock, _ in connections:
+            sock.close()
+
+
+def spawn_workers(count, address):
+    command = [sys.executable, "-m", "harness.distributed", "worker", "--connect", f"{address[0]}:{address[1]}"]
+    return [subprocess.Popen(command) for _ in range(count)]
+
+
+def parse_address(text):
+    host, _, port = text.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distributed benchmark of POST /v1/favorites")
+    roles = parser.add_subparsers(dest="role", required=True)
+    coordinator = roles.add_parser("coordinator", help="Split the load, collect and merge the results")
+    coordinator.add_argument("--listen", default=f"127.0.0.1:{PORT}", help="host:port the workers connect to")
+    coordinator.add_argument("--workers", type=int, help="Number of workers to wait for")
+    coordinator.add_argument("--spawn", type=int, default=0, help="Start this many local worker processes")
+    coordinator.add_argument("--concurrency", type=int, default=CONCURRENCY, help="Total requests in flight")
+    coordinator.add_argument("--rate", type=float, help="Total requests per second (open loop)")
+    coordinator.add_argument("--duration", type=float, default=DURATION)
+    coordinator.add_argument("--corpus", help="Corpus file every worker sends (a path valid on every host)")
+    coordinator.add_argument("--json", dest="json_path", help="Write the merged result and per-worker rows here")
+    settings.add_local_server_argument(coordinator)
+    worker = roles.add_parser("worker", help="Run the share of the load the coordinator sends")
+    worker.add_argument("--connect", required=True, help="host:port of the coordinator")
+    args = parser.parse_args()
+
+    if args.role == "worker":
+        run_worker(parse_address(args.connect))
+        return 0
+
+    workers = args.workers or args.spawn
+    if not workers:
+        parser.error("coordinator needs --workers or --spawn")
+    if args.concurrency < workers:
+        parser.error(f"--concurrency {args.concurrency} is less than the {workers} workers, each needs a thread")
+    with settings.local_server(args.local_server):
+        listener = socket.create_server(parse_address(args.listen))
+        spawned = spawn_workers(args.spawn, listener.getsockname()[:2])
+        try:
+            merged, rows = coordinate(listener, jobs(workers, settings.main_url(), args.concurrency, args.duration,
+                                                     args.rate, args.corpus))
+        finally:
+            listener.close()
+            for process in spawned:
+                process.wait()
+
+    for row in rows:
+        if "error" in row:
+            print(f"{row['worker']}: {row['error']}")
+        else:
+            print(f"{row['worker']}: {row['requests']} requests, {row['throughput']:.1f} req/s, "
+                  f"p99={row['p99'] * 1000:.2f} ms")
+    print(merged.report())
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as file:
+            json.dump({"merged": merged.to_dict(), "workers": rows}, file, indent=2)
+    return 1 if any("error" in row for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,289 @@
+"""Local stand-in for /v1/auth/tokens and /v1/favorites.
+
+Mirrors the behaviour TestSuite asserts against regions-test.2gis.com so the suite
+can run offline: python -m pytest 2GIS_favorites_AT.py --local-server
+"""
+import argparse
+import json
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytz
+
+from harness.clock import RealClock
+
+COLORS = ("BLUE", "GREEN", "RED", "YELLOW")
+TITLE_MAX_LENGTH = 999
+LAT_LIMIT = 90
+LON_LIMIT = 180
+TOKEN_LIFETIME = 2.0  # seconds since the token was issued or last used
+SERVER_TIMEZONE = pytz.timezone('Europe/London')
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class FavoritesState:
+    def __init__(self, token_lifetime=TOKEN_LIFETIME, clock=None, dedup_delay=None):
+        self.token_lifetime = token_lifetime
+        self.clock = clock or RealClock()
+        # None keeps the duplicate check and the insert atomic; a delay opens a race window between them
+        self.dedup_delay = dedup_delay
+        self.lock = threading.Lock()
+        self.tokens = {}  # token -> time of the last use
+        self.favorites = {}  # (token, title, lat, lon, color) -> favorite
+        self.next_id = 1
+
+    def now(self):
+        return self.clock.time()
+
+    def issue_token(self):
+        token = secrets.token_hex(16)
+        with self.lock:
+            self.tokens[token] = self.now()
+        return token
+
+    def check_token(self, token):
+        if token is None:
+            raise ApiError(401, "Параметр 'token' является обязательным")
+        now = self.now()
+        with self.lock:
+            last_used = self.tokens.get(token)
+            if last_used is None or now - last_used > self.token_lifetime:
+                self.tokens.pop(token, None)
+                raise ApiError(401, "Передан несуществующий или «протухший» 'token'")
+            self.tokens[token] = now
+
+    def add_favorite(self, token, title, lat, lon, color):
+        key = (token, title, lat, lon, color)
+        if self.dedup_delay is not None:
+            with self.lock:
+                favorite = self.favorites.get(key)
+            if favorite is not None:
+                return favorite
+            time.sleep(self.dedup_delay)
+        with self.lock:
+            favorite = None if self.dedup_delay is not None else self.favorites.get(key)
+            if favorite is None:
+                created_at = datetime.fromtimestamp(self.now(), SERVER_TIMEZONE)
+                favorite = {
+                    "id": self.next_id,
+                    "title": title,
+                    "lat": lat,
+                    "lon": lon,
+                    "color": color,
+                    "created_at": created_at.isoformat(timespec="seconds")
+                }
+                self.next_id += 1
+                self.favorites.setdefault(key, favorite)
+        return favorite
+
+
+class Capacity:
+    """Artificial service time and a limited number of workers, so load modes can watch the stand-in degrade."""
+
+    def __init__(self, latency=0.0, workers=None, max_queue=None):
+        self.latency = latency  # real seconds, the virtual clock must not skip them
+        self.workers = threading.Semaphore(workers) if workers else None
+        self.max_queue = max_queue
+        self.lock = threading.Lock()
+        self.waiting = 0
+
+    @contextmanager
+    def serve(self):
+        if self.workers is None:
+            time.sleep(self.latency)
+            yield
+            return
+        with self.lock:
+            if self.max_queue is not None and self.waiting >= self.max_queue:
+                raise ApiError(429, "Слишком много запросов")
+            self.waiting += 1
+        self.workers.acquire()
+        with self.lock:
+            self.waiting -= 1
+        try:
+            time.sleep(self.latency)
+            yield
+        finally:
+            self.workers.release()
+
+
+def parse_title(params):
+    if "title" not in params:
+        raise ApiError(400, "Параметр 'title' является обязательным")
+    title = params["title"]
+    if title == "":
+        raise ApiError(400, "Параметр 'title' не может быть пустым")
+    if len(title) > TITLE_MAX_LENGTH:
+        raise ApiError(400, f"Параметр 'title' должен содержать не более {TITLE_MAX_LENGTH} символов")
+    return title
+
+
+def parse_coordinate(params, name, limit):
+    if name not in params:
+        raise ApiError(400, f"Параметр '{name}' является обязательным")
+    try:
+        value = float(params[name])
+    except ValueError:
+        raise ApiError(400, f"Параметр '{name}' должен быть числом")
+    if value != value or value in (float("inf"), float("-inf")):
+        raise ApiError(400, f"Параметр '{name}' должен быть числом")
+    if value > limit:
+        raise ApiError(400, f"Параметр '{name}' должен быть не более {limit}")
+    if value < -limit:
+        raise ApiError(400, f"Параметр '{name}' должен быть не менее -{limit}")
+    return value
+
+
+def parse_color(params):
+    if "color" not in params:
+        return None
+    color = params["color"]
+    if color not in COLORS:
+        raise ApiError(400, f"Параметр 'color' может быть одним из следующих значений: {', '.join(COLORS)}")
+    return color
+
+
+class FavoritesHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "FakeFavorites/1.0"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        length = int(self.headers.get("Content-Length") or 0)
+        raw_body = self.rfile.read(length)
+        try:
+            if path == "/v1/auth/tokens":
+                self.issue_token()
+            elif path == "/v1/favorites":
+                with self.server.capacity.serve():
+                    self.add_favorite(raw_body)
+            else:
+                raise ApiError(404, f"Метод {path} не найден")
+        except ApiError as error:
+            self.send_json(error.status, {"error": {"message": error.message}})
+
+    def issue_token(self):
+        token = self.server.state.issue_token()
+        self.send_json(200, {}, cookies={"token": token})
+
+    def add_favorite(self, raw_body):
+        token = self.read_token()
+        self.server.state.check_token(token)
+        form = parse_qs(raw_body.decode("utf-8"), keep_blank_values=True)
+        params = {name: values[-1] for name, values in form.items()}
+        title = parse_title(params)
+        lat = parse_coordinate(params, "lat", LAT_LIMIT)
+        lon = parse_coordinate(params, "lon", LON_LIMIT)
+        color = parse_color(params)
+        self.send_json(200, self.server.state.add_favorite(token, title, lat, lon, color))
+
+    def read_token(self):
+        cookie = SimpleCookie(self.headers.get("Cookie", ""))
+        if "token" not in cookie:
+            return None
+        return cookie["token"].value
+
+    def send_json(self, status, payload, cookies=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (cookies or {}).items():
+            self.send_header("Set-Cookie", f"{name}={value}; Path=/")
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def date_time_string(self, timestamp=None):
+        return super().date_time_string(self.server.state.now() if timestamp is None else timestamp)
+
+    def log_message(self, format, *args):
+        pass  # keep the pytest output clean
+
+
+class FakeFavoritesServer:
+    def __init__(self, host="127.0.0.1", port=0, token_lifetime=TOKEN_LIFETIME, clock=None, capacity=None,
+                 dedup_delay=None):
+        self.httpd = ThreadingHTTPServer((host, port), FavoritesHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.request_queue_size = 128  # the default of 5 refuses connections long before load modes saturate it
+        self.httpd.state = FavoritesState(token_lifetime, clock, dedup_delay)
+        self.httpd.capacity = capacity or Capacity()
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def state(self):
+        return self.httpd.state
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="fake-favorites", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self.thread is not None:
+            self.thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def add_capacity_arguments(parser):
+    parser.add_argument("--server-latency", type=float, default=0.0,
+                        help="Seconds the stand-in spends on every POST /v1/favorites")
+    parser.add_argument("--server-workers", type=int,
+                        help="POST /v1/favorites requests the stand-in serves at once, the rest wait")
+    parser.add_argument("--server-max-queue", type=int,
+                        help="Waiting requests beyond this get 429 from the stand-in")
+    parser.add_argument("--server-dedup-delay", type=float,
+                        help="Seconds between the stand-in's duplicate check and insert, to let identical requests race")
+
+
+def capacity_from_args(args):
+    return Capacity(args.server_latency, args.server_workers, args.server_max_queue)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the favorites API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--token-lifetime", type=float, default=TOKEN_LIFETIME)
+    add_capacity_arguments(parser)
+    args = parser.parse_args()
+    server = FakeFavoritesServer(args.host, args.port, args.token_lifetime, capacity=capacity_from_args(args),
+                                 dedup_delay=args.server_dedup_delay)
+    print(f"Serving the favorites API on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
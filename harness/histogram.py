@@ -0,0 +1,81 @@
+"""Mergeable latency histogram with log-linear buckets.
+
+Bucket i holds values up to GROWTH ** i microseconds, so every percentile is
+reported with at most PRECISION relative error regardless of the range. Two
+histograms merge by adding their counts, which lets runs, windows and worker
+processes be combined after the fact.
+"""
+import math
+
+PRECISION = 0.01
+GROWTH = 1 + PRECISION
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = {}  # bucket index -> number of values
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    @staticmethod
+    def bucket(seconds):
+        micros = seconds * 1e6
+        return 0 if micros <= 1 else math.ceil(math.log(micros, GROWTH))
+
+    def record(self, seconds):
+        index = self.bucket(seconds)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def merge(self, other):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def percentile(self, percent):
+        """Upper bound of the bucket holding the given percentile, in seconds."""
+        if not self.count:
+            return 0.0
+        rank = math.ceil(percent / 100 * self.count)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(GROWTH ** index / 1e6, self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def summary(self, percentiles=PERCENTILES):
+        result = {"count": self.count, "mean": self.mean, "min": self.min if self.count else 0.0, "max": self.max}
+        for percent in percentiles:
+            result[f"p{percent:g}"] = self.percentile(percent)
+        return result
+
+    def to_dict(self):
+        return {"precision": PRECISION, "counts": {str(index): count for index, count in self.counts.items()},
+                "count": self.count, "total": self.total, "min": self.min if self.count else None, "max": self.max}
+
+    @classmethod
+    def from_dict(cls, data):
+        if data["precision"] != PRECISION:
+            raise ValueError(f"Can't merge a histogram with precision {data['precision']} into {PRECISION}")
+        histogram = cls()
+        histogram.counts = {int(index): count for index, count in data["counts"].items()}
+        histogram.count = data["count"]
+        histogram.total = data["total"]
+        histogram.min = math.inf if data["min"] is None else data["min"]
+        histogram.max = data["max"]
+        return histogram
@@ -0,0 +1,125 @@
+"""Shared keep-alive HTTP client the suite sends every request through."""
+import threading
+import time
+from http.cookiejar import DefaultCookiePolicy
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlsplit
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+POOL_SIZE = 10
+TIMEOUT = 10.0  # seconds, for both connect and read
+
+
+class ConnectionStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.opened = 0
+        self.requests = 0
+        self.local = threading.local()  # connect time of the request the current thread is sending
+
+    def connection_opened(self, seconds=0.0):
+        with self.lock:
+            self.opened += 1
+        self.local.connect = getattr(self.local, "connect", 0.0) + seconds
+
+    def take_connect_time(self):
+        seconds, self.local.connect = getattr(self.local, "connect", 0.0), 0.0
+        return seconds
+
+    def request_sent(self):
+        with self.lock:
+            self.requests += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {"requests": self.requests, "opened": self.opened, "reused": max(self.requests - self.opened, 0)}
+
+
+def counting_pool(pool_class, stats):
+    # Counted at connect() because urllib3 reconnects a dropped connection in place, without _new_conn()
+    class CountingConnection(pool_class.ConnectionCls):
+        def connect(self):
+            started = time.perf_counter()
+            try:
+                return super().connect()
+            finally:
+                stats.connection_opened(time.perf_counter() - started)
+
+    class CountingPool(pool_class):
+        ConnectionCls = CountingConnection
+
+    CountingPool.__name__ = f"Counting{pool_class.__name__}"
+    return CountingPool
+
+
+class CountingAdapter(HTTPAdapter):
+    def __init__(self, stats, **kwargs):
+        self.stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": counting_pool(HTTPConnectionPool, self.stats),
+            "https": counting_pool(HTTPSConnectionPool, self.stats)
+        }
+
+    def send(self, request, **kwargs):
+        self.stats.request_sent()
+        return super().send(request, **kwargs)
+
+
+class HttpClient:
+    def __init__(self, pool_size=POOL_SIZE, timeout=TIMEOUT, keep_alive=True):
+        self.timeout = timeout
+        self.stats = ConnectionStats()
+        self.observers = []  # called with a timing record after every request
+        self.session = requests.Session()
+        # Tokens are passed explicitly per request, so the shared session must never remember one
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        if not keep_alive:
+            self.session.headers["Connection"] = "close"
+        adapter = CountingAdapter(self.stats, pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def post(self, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        if not self.observers:
+            return self.session.post(url, **kwargs)
+        self.stats.take_connect_time()
+        started = time.perf_counter()
+        try:
+            response = self.session.post(url, **kwargs)
+        except Exception as error:
+            self.notify(url, started, error=type(error).__name__)
+            raise
+        self.notify(url, started, response)
+        return response
+
+    def notify(self, url, started, response=None, error=None):
+        total = time.perf_counter() - started
+        record = {
+            "method": "POST",
+            "path": urlsplit(url).path,
+            "status": response.status_code if response is not None else error,
+            "connect": self.stats.take_connect_time(),
+            # requests stops its clock once the headers are parsed, before the body is read
+            "ttfb": response.elapsed.total_seconds() if response is not None else total,
+            "total": total,
+            "request_bytes": len(response.request.body or "") if response is not None else 0,
+            "response_bytes": len(response.content) if response is not None else 0
+        }
+        for observer in self.observers:
+            observer(record)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,17 @@
+"""Request bodies for POST /v1/favorites, built the same way the suite builds them."""
+FAVORITES_METHOD = "/v1/favorites"
+TITLE = "TestTitle"
+LAT = 50.0  # The valid values are between -90 and 90
+LON = 50.0  # The valid values are between -180 and 180
+
+
+def favorite_body(title=TITLE, lat=LAT, lon=LON, color=None):
+    body = {
+        "title": title,
+        "lat": lat,
+        "lon": lon
+    }
+    if color is not None:
+        body["color"] = color
+    return body
+
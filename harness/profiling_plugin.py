@@ -0,0 +1,270 @@
+"""pytest plugin that profiles the client side of every test.
+
+--profile DIR samples the test thread's stack every --profile-interval seconds
+and takes tracemalloc snapshots around the setup (where setup_method takes a
+token) and the call of each test. Every sample is put in one of three
+buckets by its innermost frame: network (blocked in a socket), waiting (on a
+lock, a condition or a sleep) or harness (Python code running: building
+bodies, cookies, JSON decoding, printing). Thread CPU time gives a second,
+sampling-free split of wall time into harness CPU and waiting.
+
+DIR gets one JSON profile and one folded-stack file per test and phase, and
+profile.folded with every sample of the run, rooted at the test id, which
+flamegraph.pl, speedscope or inferno render as a flame graph.
+"""
+import json
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from functools import lru_cache
+
+import pytest
+
+INTERVAL = 0.001  # seconds between stack samples
+TRACE_FRAMES = 8  # frames tracemalloc keeps per allocation, enough to reach the harness code that caused it
+TOP = 15
+# (path suffix, function or None for any) of innermost frames that mean the thread is blocked
+NETWORK_FRAMES = [("socket.py", None), ("ssl.py", None), ("selectors.py", None),
+                  ("http/client.py", "send"), ("connection.py", "create_connection")]
+WAITING_FRAMES = [("threading.py", "wait"), ("threading.py", "acquire"), ("queue.py", "get"), ("clock.py", "sleep")]
+# Frames of the test runner itself, left out of the stacks
+RUNNER_PATHS = (os.sep + "_pytest" + os.sep, os.sep + "pluggy" + os.sep)
+# Allocations of the in-process stand-in and of the profiler land in the same snapshots; they are not client work
+EXCLUDED_PATHS = ("fake_server.py", "socketserver.py", os.path.join("http", "server.py"), "profiling_plugin.py")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("profile", "client-side profiling")
+    group.addoption("--profile", metavar="DIR", help="Write CPU and allocation profiles of every test to DIR")
+    group.addoption("--profile-interval", type=float, default=INTERVAL, help="Seconds between stack samples")
+
+
+@lru_cache(maxsize=None)
+def frame_name(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def matches(rules, code):
+    return any(code.co_filename.endswith(suffix) and function in (None, code.co_name) for suffix, function in rules)
+
+
+def classify(code):
+    if matches(NETWORK_FRAMES, code):
+        return "network"
+    if matches(WAITING_FRAMES, code):
+        return "waiting"
+    return "harness"
+
+
+class PhaseProfile:
+    def __init__(self, test, phase):
+        self.test = test
+        self.phase = phase
+        self.stacks = Counter()  # tuple of code objects, outermost first -> samples
+        self.buckets = Counter()  # network / waiting / harness -> samples
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.allocations = []
+        self.peak = 0
+        self.snapshot = None  # tracemalloc snapshot of what the phase allocated and kept
+        self.started = None  # (perf_counter, thread_time) at the start
+
+    def sample(self, frame):
+        codes = []
+        while frame is not None:
+            if not any(path in frame.f_code.co_filename for path in RUNNER_PATHS):
+                codes.append(frame.f_code)
+            frame = frame.f_back
+        if not codes:
+            return
+        # Code objects only here; names are formatted once per distinct stack when the profile is written
+        self.buckets[classify(codes[0])] += 1
+        self.stacks[tuple(reversed(codes))] += 1
+
+    def folded(self):
+        return Counter({";".join(map(frame_name, stack)): count for stack, count in self.stacks.items()})
+
+    def to_dict(self):
+        samples = sum(self.buckets.values())
+        return {
+            "test": self.test,
+            "phase": self.phase,
+            "wall_ms": self.wall * 1000,
+            "cpu_ms": self.cpu * 1000,
+            "wait_ms": max(self.wall - self.cpu, 0.0) * 1000,
+            "samples": dict(self.buckets),
+            "shares": {bucket: count / samples for bucket, count in self.buckets.items()} if samples else {},
+            "top_stacks": [{"stack": stack, "samples": count} for stack, count in self.folded().most_common(TOP)],
+            "allocations": self.allocations,
+            "peak_bytes": self.peak
+        }
+
+
+def allocation_site(traceback):
+    """The innermost frame in this repository's code, or the innermost frame when none is."""
+    for frame in traceback:
+        if frame.filename.startswith(ROOT) and os.sep + "site-packages" + os.sep not in frame.filename:
+            return f"{os.path.relpath(frame.filename, ROOT)}:{frame.lineno}"
+    return f"{traceback[0].filename}:{traceback[0].lineno}"
+
+
+def allocations(snapshot):
+    """Bytes and blocks still alive at the end of a phase, by allocation site."""
+    sites = {}
+    for stat in snapshot.statistics("traceback"):
+        if any(frame.filename.endswith(EXCLUDED_PATHS) for frame in stat.traceback):
+            continue
+        site = sites.setdefault(allocation_site(stat.traceback), [0, 0])
+        site[0] += stat.size
+        site[1] += stat.count
+    top = sorted(sites.items(), key=lambda item: item[1][0], reverse=True)[:TOP]
+    return [{"site": site, "bytes": size, "blocks": count} for site, (size, count) in top]
+
+
+class Profiler:
+    def __init__(self, directory, interval=INTERVAL):
+        self.directory = directory
+        self.interval = interval
+        self.target = threading.main_thread().ident
+        self.current = None
+        self.pending = []  # phases of the running test, written once it is torn down
+        self.aggregate = os.path.join(directory, "profile.folded")
+        self.profiles = []
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._sample, name="profiler-sampler", daemon=True)
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        open(self.aggregate, "w").close()
+        self.thread.start()
+        return self
+
+    def trace(self):
+        # Started after collection, so the modules imported by then don't weigh on every snapshot
+        tracemalloc.start(TRACE_FRAMES)
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        tracemalloc.stop()
+
+    def _sample(self):
+        while not self.stopped.wait(self.interval):
+            profile = self.current
+            frame = sys._current_frames().get(self.target)
+            if profile is not None and frame is not None:
+                profile.sample(frame)
+
+    def begin(self, test, phase):
+        profile = PhaseProfile(test, phase)
+        # Traces from before the phase are dropped, so the snapshot at its end holds only what the phase allocated.
+        # Comparing two snapshots of the whole heap instead took seconds per test.
+        tracemalloc.clear_traces()
+        tracemalloc.reset_peak()
+        profile.started = (time.perf_counter(), time.thread_time())
+        self.current = profile
+
+    def end(self):
+        profile, self.current = self.current, None
+        wall, cpu = profile.started
+        profile.wall = time.perf_counter() - wall
+        profile.cpu = time.thread_time() - cpu
+        profile.peak = tracemalloc.get_traced_memory()[1]
+        profile.snapshot = tracemalloc.take_snapshot()
+        self.pending.append(profile)
+
+    def flush(self):
+        """Groups the allocations of the finished test and writes its profiles.
+
+        Done after teardown: between setup and call it would age the token setup_method took.
+        """
+        for profile in self.pending:
+            profile.allocations = allocations(profile.snapshot)
+            profile.snapshot = None
+            name = re.sub(r"[^\w.-]+", "_", f"{profile.test}-{profile.phase}")[:150]
+            with open(os.path.join(self.directory, name + ".json"), "w", encoding="utf-8") as file:
+                json.dump(profile.to_dict(), file, indent=2, ensure_ascii=False)
+            folded = profile.folded()
+            write_folded(os.path.join(self.directory, name + ".folded"), folded)
+            # Appended test by test and dropped from memory, the run may have thousands of tests
+            root = f"{profile.test} [{profile.phase}]".replace(";", ",")
+            write_folded(self.aggregate, Counter({f"{root};{stack}": count for stack, count in folded.items()}), "a")
+            profile.stacks = Counter()
+        self.profiles += self.pending
+        self.pending = []
+
+
+def write_folded(path, stacks, mode="w"):
+    with open(path, mode, encoding="utf-8") as file:
+        for stack, count in stacks.items():
+            file.write(f"{stack} {count}\n")
+
+
+def pytest_configure(config):
+    directory = config.getoption("--profile")
+    config.profiler = Profiler(directory, config.getoption("--profile-interval")).start() if directory else None
+
+
+def pytest_collection_finish(session):
+    if session.config.profiler is not None:
+        session.config.profiler.trace()
+
+
+def pytest_unconfigure(config):
+    if getattr(config, "profiler", None) is not None:
+        config.profiler.stop()
+
+
+def profiled(item, phase):
+    profiler = item.config.profiler
+    if profiler is None:
+        return False
+    profiler.begin("::".join([item.path.name] + item.nodeid.split("::")[1:]), phase)
+    return True
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_setup(item):
+    active = profiled(item, "setup")
+    yield
+    if active:
+        item.config.profiler.end()
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+    active = profiled(item, "call")
+    yield
+    if active:
+        item.config.profiler.end()
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_teardown(item):
+    yield
+    if item.config.profiler is not None:
+        item.config.profiler.flush()
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    profiler = getattr(config, "profiler", None)
+    if profiler is None or not profiler.profiles:
+        return
+    wall = sum(profile.wall for profile in profiler.profiles)
+    cpu = sum(profile.cpu for profile in profiler.profiles)
+    buckets = sum((profile.buckets for profile in profiler.profiles), Counter())
+    samples = sum(buckets.values()) or 1
+    terminalreporter.write_sep("-", f"client profile in {profiler.directory}")
+    terminalreporter.write_line(f"wall {wall * 1000:.0f} ms, harness cpu {cpu * 1000:.0f} ms "
+                                f"({cpu / wall:.0%}), waiting {(wall - cpu) * 1000:.0f} ms")
+    terminalreporter.write_line("samples: " + ", ".join(f"{bucket} {count / samples:.0%}"
+                                                        for bucket, count in buckets.most_common()))
+    heaviest = sorted(profiler.profiles, key=lambda profile: profile.cpu, reverse=True)[:5]
+    for profile in heaviest:
+        terminalreporter.write_line(f"{profile.test} [{profile.phase}]: cpu {profile.cpu * 1000:.1f} ms "
+                                    f"of {profile.wall * 1000:.1f} ms, peak {profile.peak / 1024:.0f} KiB")
@@ -0,0 +1,230 @@
+"""Concurrent idempotency race for POST /v1/favorites.
+
+test_double_set_same_favorite sends the same body twice in a row. Here N
+identical bodies under one token are released together by a barrier, from
+threads or from separate processes, and the harness records which ids came
+back, how long every call took and whether duplicates were created. A sweep
+doubles N to find where deduplication breaks or where the endpoint starts
+serialising the calls.
+
+    python -m harness.race --local-server --max-racers 64
+    python -m harness.race --local-server --server-dedup-delay 0.005 --processes
+"""
+import argparse
+import json
+import multiprocessing
+import queue
+import statistics
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+import requests
+
+from harness import settings
+from harness.fake_server import add_capacity_arguments, capacity_from_args
+from harness.payloads import FAVORITES_METHOD, favorite_body
+from harness.token_broker import AUTH_METHOD
+
+MAX_RACERS = 32
+BARRIER_TIMEOUT = 30.0
+BASELINE_ROUNDS = 5  # single calls whose median is the N=1 duration
+SERIAL_RATIO = 0.75  # the k-th fastest call / (k * single call), typically, above this means the calls queue
+
+
+class RaceResult:
+    def __init__(self, racers, outcomes):
+        self.racers = racers
+        self.outcomes = outcomes  # (status, id or None, released at, seconds), one per racer
+
+    @property
+    def ids(self):
+        return Counter(favorite_id for status, favorite_id, _, _ in self.outcomes if favorite_id is not None)
+
+    @property
+    def statuses(self):
+        return Counter(status for status, _, _, _ in self.outcomes)
+
+    @property
+    def duplicates(self):
+        """Favorites created beyond the first one."""
+        return max(len(self.ids) - 1, 0)
+
+    @property
+    def durations(self):
+        return sorted(seconds for _, _, _, seconds in self.outcomes)
+
+    @property
+    def release_spread(self):
+        released = [at for _, _, at, _ in self.outcomes]
+        return max(released) - min(released)
+
+    def to_dict(self):
+        durations = self.durations
+        return {
+            "racers": self.racers,
+            "distinct_ids": len(self.ids),
+            "duplicates": self.duplicates,
+            "statuses": dict(self.statuses),
+            "release_spread": self.release_spread,
+            "median": statistics.median(durations),
+            "max": durations[-1]
+        }
+
+
+def post_once(post, url, body, cookies, barrier):
+    barrier.wait(BARRIER_TIMEOUT)
+    released = time.time()  # wall clock, comparable between processes
+    started = time.perf_counter()
+    try:
+        response = post(url, data=body, cookies=cookies)
+    except requests.exceptions.RequestException as error:
+        return type(error).__name__, None, released, time.perf_counter() - started
+    seconds = time.perf_counter() - started
+    favorite_id = response.json().get("id") if response.status_code == 200 else None
+    return str(response.status_code), favorite_id, released, seconds
+
+
+def race_threads(client, main_url, body, cookies, racers):
+    barrier = threading.Barrier(racers)
+    outcomes = [None] * racers
+
+    def racer(index):
+        try:
+            # A token request is harmless, and it leaves an open connection in the pool for the real call
+            client.post(main_url + AUTH_METHOD)
+            outcomes[index] = post_once(client.post, main_url + FAVORITES_METHOD, body, cookies, barrier)
+        except Exception as error:
+            # Releases the others at once (they record BrokenBarrierError) instead of after BARRIER_TIMEOUT
+            barrier.abort()
+            outcomes[index] = (type(error).__name__, None, time.time(), 0.0)
+
+    threads = [threading.Thread(target=racer, args=(index,), name=f"racer-{index}") for index in range(racers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return RaceResult(racers, outcomes)
+
+
+def _process_racer(main_url, body, ready, cookies_queue, barrier, results):
+    try:
+        with requests.Session() as session:
+            session.post(main_url + AUTH_METHOD)
+            ready.wait(BARRIER_TIMEOUT)
+            cookies = cookies_queue.get(timeout=BARRIER_TIMEOUT)
+            if cookies is None:
+                raise RuntimeError("No token to race with")
+            results.put(post_once(session.post, main_url + FAVORITES_METHOD, body, cookies, barrier))
+    except Exception as error:
+        # As in race_threads: the parent and the other racers are released at once and the error is the outcome
+        ready.abort()
+        barrier.abort()
+        results.put((type(error).__name__, None, time.time(), 0.0))
+
+
+def race_processes(main_url, body, tokens, racers):
+    context = multiprocessing.get_context("spawn")  # the parent runs threads, forking it is unsafe
+    ready = context.Barrier(racers + 1)
+    barrier = context.Barrier(racers)
+    cookies_queue = context.Queue()
+    results = context.Queue()
+    processes = [context.Process(target=_process_racer,
+                                 args=(main_url, body, ready, cookies_queue, barrier, results))
+                 for _ in range(racers)]
+    for process in processes:
+        process.start()
+    # Spawning takes longer than a token lives, so the token is only taken once every racer is up
+    try:
+        ready.wait(BARRIER_TIMEOUT)
+    except threading.BrokenBarrierError:
+        pass  # a racer failed before the release, every racer has recorded an outcome
+    else:
+        cookies = None
+        try:
+            cookies = tokens.acquire()
+        finally:
+            for _ in processes:
+                cookies_queue.put(cookies)
+    outcomes = []
+    for _ in processes:
+        try:
+            outcomes.append(results.get(timeout=BARRIER_TIMEOUT))
+        except queue.Empty:
+            break
+    for process in processes:
+        process.join(BARRIER_TIMEOUT)
+    # A racer that died without a word, killed or crashed in the interpreter
+    outcomes += [("NoOutcome", None, time.time(), 0.0)] * (racers - len(outcomes))
+    return RaceResult(racers, outcomes)
+
+
+def race(client, tokens, main_url, racers, processes=False):
+    """One round under a fresh token and title."""
+    body = favorite_body(title=f"Race {uuid.uuid4().hex[:8]}")
+    if processes:
+        return race_processes(main_url, body, tokens, racers)
+    return race_threads(client, main_url, body, tokens.acquire(), racers)
+
+
+def single_call(client, tokens, main_url, processes=False, rounds=BASELINE_ROUNDS):
+    """Median duration of a lone call, over several rounds so that one slow call does not set the scale."""
+    return statistics.median(race(client, tokens, main_url, 1, processes).durations[0] for _ in range(rounds))
+
+
+def serial_ratio(durations, single):
+    """How far the sorted durations follow k * single, the k-th call waiting for the k - 1 before it.
+
+    The median over ranks 2..N, so a lone straggler moves it no more than any other call.
+    """
+    return statistics.median(seconds / (rank * single) for rank, seconds in enumerate(durations[1:], 2))
+
+
+def sweep(client, tokens, main_url, max_racers=MAX_RACERS, processes=False, report=print):
+    """Races 1, 2, 4 ... max_racers identical requests, each round under a fresh token and title."""
+    rounds = []
+    single = single_call(client, tokens, main_url, processes)
+    racers = 1
+    while racers <= max_racers:
+        result = race(client, tokens, main_url, racers, processes)
+        row = result.to_dict()
+        # No single call went through when single is 0.0, nothing to scale by
+        row["serial_ratio"] = serial_ratio(result.durations, single) if racers > 1 and single else None
+        row["serialised"] = row["serial_ratio"] is not None and row["serial_ratio"] > SERIAL_RATIO
+        rounds.append(row)
+        report(f"N={racers:<4} ids={row['distinct_ids']:<4} duplicates={row['duplicates']:<4} "
+               f"median={row['median'] * 1000:.1f} ms max={row['max'] * 1000:.1f} ms "
+               f"spread={row['release_spread'] * 1000:.2f} ms{' SERIALISED' if row['serialised'] else ''}"
+               + ("" if list(row["statuses"]) == ["200"] else f" statuses={row['statuses']}"))
+        racers *= 2
+    return rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Race identical POST /v1/favorites requests under one token")
+    parser.add_argument("--max-racers", type=int, default=MAX_RACERS, help="The sweep doubles N up to this")
+    parser.add_argument("--processes", action="store_true", help="Race from separate processes instead of threads")
+    parser.add_argument("--json", dest="json_path", help="Write every round to this file")
+    settings.add_local_server_argument(parser)
+    add_capacity_arguments(parser)
+    args = parser.parse_args()
+
+    with settings.local_server(args.local_server, capacity=capacity_from_args(args),
+                               dedup_delay=args.server_dedup_delay), \
+            settings.client_and_tokens(args.max_racers) as (client, tokens):
+        rounds = sweep(client, tokens, settings.main_url(), args.max_racers, args.processes)
+
+    broken = next((row["racers"] for row in rounds if row["duplicates"]), None)
+    serialised = next((row["racers"] for row in rounds if row["serialised"]), None)
+    print(f"Deduplication {'breaks at N=' + str(broken) if broken else 'held for every N'}; "
+          f"{'calls serialise from N=' + str(serialised) if serialised else 'no serialisation seen'}")
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as file:
+            json.dump(rounds, file, indent=2)
+    return 1 if broken else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""Structured, bounded log of the responses each test saw.
+
+Tests call results.log(method, response) instead of printing the body. The
+responses are buffered per test; when the test ends its line goes through a
+bounded queue to a background thread that writes NDJSON, so a slow disk never
+stalls a test, and when the queue is full lines are dropped and counted
+instead. Failing tests keep their full bodies; passing ones are sampled and
+their strings truncated. A JUnit XML summary can be written at the end.
+"""
+import json
+import queue
+import random
+import threading
+import xml.etree.ElementTree as ET
+
+TRUNCATE = 200  # characters kept of every string in a passing test's bodies
+SAMPLE = 1.0  # share of passing tests whose responses are kept at all
+MAX_QUEUE = 10000  # lines waiting for the writer before new ones are dropped
+SEED = 2023
+
+
+def truncated(value, limit):
+    if isinstance(value, str) and len(value) > limit:
+        return f"{value[:limit]}...(+{len(value) - limit})"
+    if isinstance(value, dict):
+        return {key: truncated(item, limit) for key, item in value.items()}
+    if isinstance(value, list):
+        return [truncated(item, limit) for item in value]
+    return value
+
+
+class ResultSink:
+    def __init__(self, path=None, junit=None, truncate=TRUNCATE, sample=SAMPLE, max_queue=MAX_QUEUE, seed=SEED):
+        self.path = path
+        self.junit = junit
+        self.truncate = truncate
+        self.sample = sample
+        self.random = random.Random(seed)
+        self.local = threading.local()  # the runner runs cases on several threads
+        self.lock = threading.Lock()
+        self.cases = []  # (test, outcome, seconds, message) for the JUnit summary
+        self.dropped = 0
+        self.queue = queue.Queue(max_queue)
+        self.thread = None
+        if path:
+            self.thread = threading.Thread(target=self._write, name="result-sink", daemon=True)
+            self.thread.start()
+
+    def begin(self, test):
+        self.local.test = test
+        self.local.responses = []
+
+    def log(self, method, response):
+        """Keeps one response (an ApiResponse) of the running test."""
+        responses = getattr(self.local, "responses", None)
+        if responses is not None:
+            body = response.body if response.body is not None else response.text
+            responses.append({"method": method, "status": response.status_code, "body": body})
+
+    def finish(self, outcome, seconds, message=""):
+        """Ends the running test and returns its responses as text when it did not pass, else ''."""
+        test, responses = getattr(self.local, "test", None), getattr(self.local, "responses", None)
+        self.local.test = self.local.responses = None
+        if test is None:
+            return ""
+        with self.lock:
+            self.cases.append((test, outcome, seconds, message))
+            keep = outcome != "passed" or self.random.random() < self.sample
+        if outcome == "passed":
+            responses = [truncated(item, self.truncate) for item in responses] if keep else None
+        if self.thread is not None:
+            line = {"test": test, "outcome": outcome, "ms": round(seconds * 1000, 3)}
+            if message:
+                line["message"] = message
+            if responses is not None:
+                line["responses"] = responses
+            try:
+                self.queue.put_nowait(line)
+            except queue.Full:
+                with self.lock:
+                    self.dropped += 1
+        if outcome == "passed" or not responses:
+            return ""
+        return "\n".join(f"{item['method']}'s response ({item['status']}): "
+                         f"{json.dumps(item['body'], ensure_ascii=False)}" for item in responses)
+
+    def _write(self):
+        with open(self.path, "w", encoding="utf-8") as file:
+            while True:
+                line = self.queue.get()
+                if line is None:
+                    return
+                file.write(json.dumps(line, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    def close(self):
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+        if self.junit:
+            write_junit(self.junit, self.cases)
+
+
+def write_junit(path, cases):
+    suite = ET.Element("testsuite", name="favorites", tests=str(len(cases)),
+                       failures=str(sum(outcome == "failed" for _, outcome, _, _ in cases)),
+                       errors=str(sum(outcome == "error" for _, outcome, _, _ in cases)),
+                       skipped=str(sum(outcome == "skipped" for _, outcome, _, _ in cases)),
+                       time=f"{sum(seconds for _, _, seconds, _ in cases):.3f}")
+    for test, outcome, seconds, message in cases:
+        classname, _, name = test.rpartition("::")
+        case = ET.SubElement(suite, "testcase", classname=classname, name=name, time=f"{seconds:.3f}")
+        if outcome in ("failed", "error", "skipped"):
+            ET.SubElement(case, "failure" if outcome == "failed" else outcome, message=message[:500])
+    ET.ElementTree(suite).write(path, encoding="utf-8", xml_declaration=True)
@@ -0,0 +1,59 @@
+"""pytest plugin that feeds the suite's responses to a ResultSink.
+
+--results PATH writes one NDJSON line per test, --results-junit PATH a JUnit
+summary. Without them nothing is written, but a failing test still shows its
+full responses in the report, as the old prints did.
+"""
+import pytest
+
+from harness.result_sink import MAX_QUEUE, SAMPLE, TRUNCATE, ResultSink
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("results", "response log")
+    group.addoption("--results", metavar="PATH", help="Write every test's responses as NDJSON to this file")
+    group.addoption("--results-junit", metavar="PATH", help="Write a JUnit XML summary to this file")
+    group.addoption("--results-truncate", type=int, default=TRUNCATE,
+                    help="Characters kept of every string in the responses of passing tests")
+    group.addoption("--results-sample", type=float, default=SAMPLE,
+                    help="Share of passing tests whose responses are written")
+    group.addoption("--results-queue", type=int, default=MAX_QUEUE,
+                    help="Lines waiting for the writer before new ones are dropped")
+
+
+def pytest_configure(config):
+    config.result_sink = ResultSink(config.getoption("--results"), config.getoption("--results-junit"),
+                                    config.getoption("--results-truncate"), config.getoption("--results-sample"),
+                                    config.getoption("--results-queue"))
+
+
+def pytest_unconfigure(config):
+    if getattr(config, "result_sink", None) is not None:
+        config.result_sink.close()
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_setup(item):
+    item.config.result_sink.begin("::".join([item.path.name] + item.nodeid.split("::")[1:]))
+    yield
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item, call):
+    outcome = yield
+    report = outcome.get_result()
+    # The call decides the outcome; a setup that fails or skips leaves no call
+    if report.when == "call" or (report.when == "setup" and not report.passed):
+        status = "error" if report.when == "setup" and report.failed else report.outcome
+        message = "" if report.passed else str(call.excinfo.value) if call.excinfo else ""
+        responses = item.config.result_sink.finish(status, report.duration, message)
+        if responses:
+            report.sections.append(("Captured responses", responses))
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    sink = config.result_sink
+    if sink.path:
+        terminalreporter.write_sep("-", f"responses written to {sink.path}")
+        if sink.dropped:
+            terminalreporter.write_line(f"{sink.dropped} tests dropped, the writer fell behind")
@@ -0,0 +1,231 @@
+"""Runs the TestSuite cases concurrently on a worker pool.
+
+The single-request cases come straight from the compiled harness.cases table
+and take only the token their row asks for. Every other test gets its own
+TestSuite instance and token, exactly as under pytest. Independent cases are
+dispatched at the same time:
+python -m harness.runner --local-server --concurrency 16
+"""
+import argparse
+import importlib.util
+import io
+import itertools
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import pytest
+
+from harness import settings
+from harness.cases import CASES
+from harness.clock import RealClock, VirtualClock
+from harness.result_sink import ResultSink
+from harness.server_clock import LazyServerClock, calibrate
+from harness.token_broker import TOKEN_LIFETIME
+
+SUITE_PATH = Path(__file__).resolve().parent.parent / "2GIS_favorites_AT.py"
+TABLE_TEST = "test_favorite_case"  # the suite's test that runs harness.cases, taken from the table here
+CONCURRENCY = 8
+
+
+def load_suite(path=SUITE_PATH):
+    # The suite's file name starts with a digit, so it can't be imported by name
+    spec = importlib.util.spec_from_file_location("favorites_suite", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.TestSuite
+
+
+class Case:
+    def __init__(self, name, kwargs, case_id, serial=False, favorite=None):
+        self.name = name
+        self.kwargs = kwargs
+        self.id = case_id
+        self.serial = serial  # moves the shared clock, so it runs alone after the concurrent ones
+        self.favorite = favorite  # the compiled harness.cases case, run without a TestSuite instance
+
+
+class CaseResult:
+    def __init__(self, case, outcome, message="", output="", duration=0.0):
+        self.case = case
+        self.outcome = outcome  # "passed", "failed", "error" or "skipped"
+        self.message = message
+        self.output = output
+        self.duration = duration
+
+
+def param_id(argname, value, index):
+    # Close to pytest's own ids: plain values as they are, anything long or unprintable by position
+    text = str(value)
+    if isinstance(value, (int, float)) or (isinstance(value, str) and text.isprintable() and 0 < len(text) <= 32):
+        return text
+    return f"{argname}{index}"
+
+
+def collect_cases(suite_class, keyword=None, sweep=False, table=CASES):
+    cases = [Case(TABLE_TEST, {}, f"{TABLE_TEST}[{favorite.id}]", favorite.serial, favorite) for favorite in table]
+    cases = [case for case in cases if keyword is None or keyword in case.id]
+    for name, method in vars(suite_class).items():
+        if not name.startswith("test_") or name == TABLE_TEST or not callable(method):
+            continue
+        marks = getattr(method, "pytestmark", [])
+        if not sweep and any(mark.name == "sweep" for mark in marks):
+            continue  # bulk sweeps are opt-in, as under pytest
+        serial = any(mark.name == "serial" for mark in marks)
+        axes = []
+        for mark in reversed(marks):
+            if mark.name != "parametrize":
+                continue
+            argnames = [arg.strip() for arg in mark.args[0].split(",")] if isinstance(mark.args[0], str) \
+                else list(mark.args[0])
+            values = [value if len(argnames) > 1 else (value,) for value in mark.args[1]]
+            axes.append([(dict(zip(argnames, value)),
+                          "-".join(param_id(arg, item, index) for arg, item in zip(argnames, value)))
+                         for index, value in enumerate(values)])
+        for combination in itertools.product(*axes):
+            kwargs = {}
+            for params, _ in combination:
+                kwargs.update(params)
+            ids = [case_id for _, case_id in combination]
+            case_id = f"{name}[{'-'.join(ids)}]" if ids else name
+            if keyword is None or keyword in case_id:
+                cases.append(Case(name, kwargs, case_id, serial))
+    return cases
+
+
+class ThreadOutput(io.TextIOBase):
+    """sys.stdout replacement that keeps each worker's prints apart, like pytest's capture."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    def capture(self):
+        self.local.buffer = io.StringIO()
+
+    def release(self):
+        buffer, self.local.buffer = self.local.buffer, None
+        return buffer.getvalue()
+
+    def write(self, text):
+        buffer = getattr(self.local, "buffer", None)
+        return (buffer or self.stream).write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def run_case(suite_class, case, client, tokens, clock, output, sink, server_clock):
+    output.capture()
+    sink.begin(case.id)
+    started = time.perf_counter()
+    try:
+        if case.favorite is not None:
+            problems = case.favorite.run(client, tokens, settings.main_url(), clock, server_clock, sink)
+            assert not problems, "; ".join(problems)
+        else:
+            instance = suite_class()
+            instance.client = client
+            instance.tokens = tokens
+            instance.clock = clock
+            instance.results = sink
+            instance.server_clock = server_clock
+            instance.setup_method()
+            getattr(instance, case.name)(**case.kwargs)
+    except AssertionError as error:
+        outcome, message = "failed", str(error)
+    except pytest.skip.Exception as skip:
+        outcome, message = "skipped", str(skip)
+    except Exception:
+        outcome, message = "error", traceback.format_exc(limit=3)
+    else:
+        outcome, message = "passed", ""
+    duration = time.perf_counter() - started
+    responses = sink.finish(outcome, duration, message)
+    return CaseResult(case, outcome, message, output.release() + responses, duration)
+
+
+def run(suite_class, cases, client, tokens, clock, concurrency=CONCURRENCY, report=print, sink=None,
+        server_clock=None):
+    sink = sink or ResultSink()
+    server_clock = server_clock or LazyServerClock(lambda: calibrate(client, settings.main_url(), clock))
+    output = ThreadOutput(sys.stdout)
+    sys.stdout, real_stdout = output, sys.stdout
+    results = []
+
+    def collect(result):
+        results.append(result)
+        report(f"{result.outcome.upper():6} {result.case.id} ({result.duration * 1000:.0f} ms)")
+        if result.outcome not in ("passed", "skipped"):
+            report(f"       {result.message}")
+
+    try:
+        # Calibration waits for second boundaries on the shared clock, so it runs before any case is in flight,
+        # and only when some case checks created_at
+        if any(case.favorite is not None and case.favorite.checks_created_at for case in cases):
+            server_clock.get()
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="case") as pool:
+            futures = [pool.submit(run_case, suite_class, case, client, tokens, clock, output, sink,
+                                   server_clock)
+                       for case in cases if not case.serial]
+            for future in as_completed(futures):
+                collect(future.result())
+        for case in cases:
+            if case.serial:
+                collect(run_case(suite_class, case, client, tokens, clock, output, sink, server_clock))
+    finally:
+        sys.stdout = real_stdout
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run TestSuite cases concurrently")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="Maximum number of cases in flight")
+    parser.add_argument("-k", dest="keyword", help="Only run cases whose id contains this substring")
+    settings.add_local_server_argument(parser)
+    parser.add_argument("--real-time", action="store_true", help="Really wait in time-based cases against the stand-in")
+    parser.add_argument("--token-lifetime", type=float, default=TOKEN_LIFETIME)
+    parser.add_argument("--coord-sweep", action="store_true", help="Also run the NumPy lat/lon boundary sweep")
+    parser.add_argument("--coord-sweep-tolerance", type=float, default=0.0,
+                        help="Let the sweep's plain decimal values come back rounded by up to this much")
+    parser.add_argument("--show-output", action="store_true",
+                        help="Print what failing cases wrote to stdout and the responses they got")
+    parser.add_argument("--results", metavar="PATH", help="Write every case's responses as NDJSON to this file")
+    parser.add_argument("--results-junit", metavar="PATH", help="Write a JUnit XML summary to this file")
+    args = parser.parse_args()
+
+    clock = VirtualClock() if args.local_server and not args.real_time else RealClock()
+    with settings.local_server(args.local_server, token_lifetime=args.token_lifetime, clock=clock), \
+            settings.client_and_tokens(args.concurrency, lifetime=args.token_lifetime, pool_size=args.concurrency,
+                                       clock=clock) as (client, tokens):
+        suite_class = load_suite()  # after the stand-in is up, the suite reads main_url() as its class is made
+        suite_class.sweep_tolerance = args.coord_sweep_tolerance
+        cases = collect_cases(suite_class, args.keyword, args.coord_sweep)
+        sink = ResultSink(args.results, args.results_junit)
+        server_clock = LazyServerClock(lambda: calibrate(client, settings.main_url(), clock))
+        started = time.perf_counter()
+        try:
+            results = run(suite_class, cases, client, tokens, clock, args.concurrency, sink=sink,
+                          server_clock=server_clock)
+        finally:
+            sink.close()
+    elapsed = time.perf_counter() - started
+
+    if args.show_output:
+        for result in results:
+            if result.outcome != "passed" and result.output:
+                print(f"----- output of {result.case.id} -----\n{result.output}")
+    counts = {outcome: sum(result.outcome == outcome for result in results)
+              for outcome in ("passed", "failed", "error", "skipped")}
+    summary = ", ".join(f"{count} {outcome}" for outcome, count in counts.items() if count)
+    print(f"{summary or 'no cases'} in {elapsed:.2f}s with concurrency {args.concurrency}")
+    if server_clock.summary():
+        print(server_clock.summary())
+    return 0 if counts["failed"] == counts["error"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
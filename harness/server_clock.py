@@ -0,0 +1,135 @@
+"""Offset between the local clock and the server's, estimated once per session.
+
+Both the Date header and created_at have one-second resolution, so a single
+round trip pins the server clock only to within a second plus the RTT. Each
+probe gives an interval for the offset (server time minus local time): the
+server read its clock somewhere between sending t0 and receiving t1 locally,
+and the true time was somewhere in the second its header shows, so
+
+    date - t1 <= offset < date + 1 - t0
+
+Every probe after the first is timed so that, if the offset were the middle
+of the interval known so far, the server would read its clock exactly at a
+second boundary. Which second the answer shows then halves the interval, so
+a handful of probes narrow the offset to about one RTT (the NTP idea, with
+the header's truncation as the extra bound).
+
+With the offset known, the second created_at shows must overlap the window
+in which the request was in flight, and the part of that second inside the
+window bounds when, after the request was sent, the server committed the
+favorite. The bounds are tight for requests that straddle a second boundary.
+
+The probes wait for second boundaries, so calibration is lazy (LazyServerClock
+runs it on the first created_at check) and its total wait is capped.
+"""
+import math
+import statistics
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from harness.token_broker import AUTH_METHOD
+
+PROBES = 12  # the most probes sent; calibration stops once the interval is as narrow as one RTT
+MAX_WAIT = 2.0  # seconds calibration may spend waiting for boundaries; past it the interval so far is used
+RESOLUTION = 1.0  # seconds, of both the Date header and created_at
+
+
+class ServerClock:
+    def __init__(self, offset, error, rtt):
+        self.offset = offset  # server time - local time, seconds
+        self.error = error  # half-width of the interval the offset is known to lie in
+        self.rtt = rtt  # smallest round trip seen while probing
+        self.lock = threading.Lock()
+        self.commits = []  # (earliest, latest) seconds from sending a request to the server committing it
+
+    def window_problems(self, created_at, sent, received):
+        """Checks created_at against the local send and receive times and records the time to commit."""
+        created = datetime.fromisoformat(created_at).timestamp()
+        earliest = sent + self.offset - self.error
+        latest = received + self.offset + self.error
+        # The commit happened in the second created_at shows and while the request was in flight
+        start = sent + self.offset
+        commit = (max(created - start, 0.0), min(created + RESOLUTION - start, received - sent))
+        with self.lock:
+            self.commits.append(commit)
+        if created + RESOLUTION < earliest or created > latest:
+            return [f"'created_at' {created_at} is outside the request's window in server time "
+                    f"[{datetime.fromtimestamp(earliest, timezone.utc).isoformat(timespec='milliseconds')}, "
+                    f"{datetime.fromtimestamp(latest, timezone.utc).isoformat(timespec='milliseconds')}]"]
+        return []
+
+    def summary(self):
+        line = (f"server clock offset {self.offset * 1000:+.1f} ms +- {self.error * 1000:.1f} ms, "
+                f"rtt {self.rtt * 1000:.1f} ms")
+        with self.lock:
+            commits = list(self.commits)
+        if commits:
+            earliest = statistics.mean(low for low, _ in commits)
+            latest = statistics.mean(high for _, high in commits)
+            line += f"; time to commit {earliest * 1000:.1f}..{latest * 1000:.1f} ms (mean bounds of {len(commits)})"
+        return line
+
+
+def calibrate(client, main_url, clock, probes=PROBES, max_wait=MAX_WAIT):
+    """Estimates the server clock offset from the Date headers of a few token requests.
+
+    Returns None when the server sends no Date header, so there is nothing to calibrate against.
+    """
+    low, high = float("-inf"), float("inf")
+    best = None  # (rtt, midpoint estimate) of the fastest probe
+    waited = 0.0
+    for index in range(probes):
+        if index:
+            # Send so that the server reads its clock right at a second boundary if the offset is the midpoint;
+            # the second in the answer then tells which half of the interval the offset is in
+            middle = (low + high) / 2
+            boundary = math.ceil(clock.time() + middle + best[0] / 2 + 0.01)
+            wait = max(boundary - middle - best[0] / 2 - clock.time(), 0)
+            if waited + wait > max_wait:
+                break
+            clock.sleep(wait)
+            waited += wait
+        sent = clock.time()
+        response = client.post(main_url + AUTH_METHOD)
+        received = clock.time()
+        if "Date" not in response.headers:
+            return None
+        date = parsedate_to_datetime(response.headers["Date"]).timestamp()
+        low, high = max(low, date - received), min(high, date + RESOLUTION - sent)
+        rtt = received - sent
+        if best is None or rtt < best[0]:
+            best = (rtt, date + RESOLUTION / 2 - (sent + received) / 2)
+        if low > high:
+            # The intervals don't meet: a clock stepped while probing. Fall back to the fastest probe alone.
+            return ServerClock(best[1], best[0] / 2 + RESOLUTION / 2, best[0])
+        if high - low <= best[0]:
+            break  # as narrow as the round trip allows
+    return ServerClock((low + high) / 2, (high - low) / 2, best[0])
+
+
+class LazyServerClock:
+    """ServerClock calibrated on the first created_at check, so sessions that never make one don't wait for it.
+
+    Without a calibrate function (a replay, where the recorded Date headers don't follow the clock) or without a
+    Date header from the server, created_at is not checked.
+    """
+
+    def __init__(self, calibrate=None):
+        self.calibrate = calibrate
+        self.lock = threading.Lock()
+        self.clock = None
+
+    def get(self):
+        with self.lock:
+            if self.calibrate is not None:
+                self.clock, self.calibrate = self.calibrate(), None
+        return self.clock
+
+    def window_problems(self, created_at, sent, received):
+        clock = self.get()
+        return clock.window_problems(created_at, sent, received) if clock is not None else []
+
+    def summary(self):
+        """The calibrated clock's summary, or None when created_at was never checked."""
+        return self.clock.summary() if self.clock is not None else None
@@ -0,0 +1,56 @@
+import os
+from contextlib import contextmanager
+
+from harness.fake_server import FakeFavoritesServer
+from harness.http_client import HttpClient
+from harness.token_broker import TokenBroker
+
+LIVE_URL = "https://regions-test.2gis.com"
+
+
+def main_url():
+    # Read on every call: conftest switches it to the local stand-in after this module is imported
+    return os.environ.get("FAVORITES_MAIN_URL", LIVE_URL)
+
+
+def add_local_server_argument(parser):
+    parser.add_argument("--local-server", action="store_true", help="Run against an in-process stand-in")
+
+
+@contextmanager
+def local_server(enabled, **options):
+    """Starts the stand-in when enabled and points main_url() at it until the block ends.
+
+    The options go to FakeFavoritesServer. Yields the server, or None when disabled.
+    """
+    if not enabled:
+        yield None
+        return
+    server = FakeFavoritesServer(**options).start()
+    previous = os.environ.get("FAVORITES_MAIN_URL")
+    os.environ["FAVORITES_MAIN_URL"] = server.url
+    try:
+        yield server
+    finally:
+        if previous is None:
+            os.environ.pop("FAVORITES_MAIN_URL", None)
+        else:
+            os.environ["FAVORITES_MAIN_URL"] = previous
+        server.stop()
+
+
+@contextmanager
+def client_and_tokens(connections, url=None, **broker_options):
+    """An HttpClient of that many pooled connections and a started TokenBroker on it, both closed on exit.
+
+    The broker mints against url, main_url() by default; broker_options go to TokenBroker.
+    """
+    client = HttpClient(pool_size=connections)
+    try:
+        tokens = TokenBroker(client, url or main_url(), **broker_options).start()
+        try:
+            yield client, tokens
+        finally:
+            tokens.stop()
+    finally:
+        client.close()
@@ -0,0 +1,249 @@
+"""Long soak of POST /v1/favorites at a fixed rate, watching for slow degradation.
+
+Bodies come from the seeded corpus stream, so hours of traffic hold one body
+at a time. A thread renews its token from the broker, which keeps minting in
+the background, before the token can expire between two of its sends (the
+server keeps a token alive for a lifetime after its last use); a 401 anyway
+takes a fresh token and sends the body again. Only the delivery counts: a
+body that still fails after the retry is an error. Once per window the run
+samples the client's RSS, its open sockets, the connections and tokens it
+opened in the window, and the window's latency percentiles and error rate, and
+appends them as a CSV row to plot. At the end every series is checked for
+drift: a steady rise over the run (Kendall's tau against time) that also
+moved the value by more than a set share.
+
+    python -m harness.fake_server --port 8080 &
+    FAVORITES_MAIN_URL=http://127.0.0.1:8080 python -m harness.soak --rate 50 --duration 14400 --out soak.csv
+
+The stand-in keeps every favorite, so run it as its own process as above;
+with --local-server its memory and sockets count as the client's.
+"""
+import argparse
+import csv
+import itertools
+import os
+import sys
+import threading
+import time
+
+from harness import settings
+from harness.bench import BenchResult, post_status
+from harness.corpus import SharedStream, stream_bodies
+from harness.payloads import FAVORITES_METHOD
+
+RATE = 20.0  # requests per second
+DURATION = 3600.0
+WINDOW = 60.0
+THREADS = 8
+WARMUP = 1  # windows left out of the drift check, while pools and caches fill
+MIN_WINDOWS = 8  # fewer windows than this after the warmup are too few to call a trend
+TAU = 0.6  # Kendall's tau against time above which a series counts as rising steadily
+GROWTH = 0.2  # and it must also end this share above where it started
+ATTEMPTS = 2  # sends of one body: the second goes with a fresh token after a 401
+RENEW_MARGIN = 0.1  # share of the token lifetime kept in reserve for the send itself
+COLUMNS = ("at", "requests", "throughput", "p50_ms", "p90_ms", "p99_ms", "error_rate", "renewals",
+           "tokens_minted", "connections_opened", "open_sockets", "rss_mb")
+WATCHED = ("rss_mb", "open_sockets", "connections_opened", "tokens_minted", "p99_ms", "error_rate")
+
+
+def rss_bytes():
+    """Resident set size of this process, or None where /proc is missing."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def open_sockets():
+    """Sockets this process has open, or None where /proc is missing."""
+    try:
+        descriptors = os.listdir("/proc/self/fd")
+    except OSError:
+        return None
+    count = 0
+    for descriptor in descriptors:
+        try:
+            count += os.readlink(f"/proc/self/fd/{descriptor}").startswith("socket:")
+        except OSError:
+            pass  # closed between listdir and readlink
+    return count
+
+
+def kendall_tau(values):
+    """Rank correlation of the values with their order: 1 for a steady rise, -1 for a steady fall."""
+    n = len(values)
+    if n < 3:
+        return 0.0
+    concordant = sum((values[j] > values[i]) - (values[j] < values[i]) for i in range(n) for j in range(i + 1, n))
+    return concordant / (n * (n - 1) / 2)
+
+
+def drift(rows, columns=WATCHED, warmup=WARMUP, tau_threshold=TAU, growth_threshold=GROWTH):
+    """(column, tau, first, last) for every series that rose steadily and by more than growth_threshold."""
+    flagged = []
+    for column in columns:
+        values = [row[column] for row in rows[warmup:] if row[column] is not None]
+        if len(values) < MIN_WINDOWS:
+            continue
+        tau = kendall_tau(values)
+        quarter = max(len(values) // 4, 1)
+        first = sum(values[:quarter]) / quarter
+        last = sum(values[-quarter:]) / quarter
+        grew = last - first > abs(first) * growth_threshold if first else last > 0
+        if tau >= tau_threshold and grew:
+            flagged.append((column, tau, first, last))
+    return flagged
+
+
+class TokenHolder:
+    """One thread's token, renewed before the server could have forgotten it."""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.cookies = None
+        self.expires = float("-inf")  # broker clock time by which the token may be gone
+        self.renewals = 0
+
+    def get(self):
+        now = self.tokens.clock.monotonic()
+        if self.expires - now < self.tokens.lifetime * RENEW_MARGIN:
+            self.renew()
+        return self.cookies
+
+    def renew(self):
+        if self.cookies is not None:
+            self.renewals += 1
+        self.cookies = self.tokens.acquire()
+        # The broker hands out tokens with at least min_remaining of their life left
+        self.expires = self.tokens.clock.monotonic() + self.tokens.min_remaining
+
+    def used(self, sent):
+        self.expires = sent + self.tokens.lifetime
+
+
+def deliver(client, url, body, holder):
+    """Sends one body, again with a fresh token after a 401. Returns the status of the last send."""
+    status = None
+    for _ in range(ATTEMPTS):
+        cookies = holder.get()
+        sent = holder.tokens.clock.monotonic()
+        status = post_status(client, url, body, cookies)
+        if status != "401":
+            if status.isdigit():  # answered, so the server saw the token
+                holder.used(sent)
+            return status
+        holder.renew()
+    return status
+
+
+def window_row(at, window, renewals, elapsed, tokens, client, totals):
+    """One time-series row; tokens and connections are counted per window, against the totals so far."""
+    requests = window.requests
+    errors = sum(count for status, count in window.statuses.items() if status != "200")
+    rss = rss_bytes()
+    return {
+        "at": round(at, 3),
+        "requests": requests,
+        "throughput": round(requests / elapsed, 3) if elapsed else 0.0,
+        "p50_ms": round(window.histogram.percentile(50) * 1000, 3),
+        "p90_ms": round(window.histogram.percentile(90) * 1000, 3),
+        "p99_ms": round(window.histogram.percentile(99) * 1000, 3),
+        "error_rate": round(errors / requests, 6) if requests else 0.0,
+        "renewals": renewals,
+        "tokens_minted": tokens.minted - totals["tokens_minted"],
+        "connections_opened": client.stats.snapshot()["opened"] - totals["connections_opened"],
+        "open_sockets": open_sockets(),
+        "rss_mb": round(rss / 2 ** 20, 3) if rss is not None else None
+    }
+
+
+def run_soak(client, tokens, main_url, bodies, rate=RATE, duration=DURATION, window=WINDOW, threads=THREADS,
+             out=None, report=print):
+    """Sends at a fixed rate for duration seconds and returns one row per window."""
+    url = main_url + FAVORITES_METHOD
+    lock = threading.Lock()
+    current = [BenchResult("soak", threads, rate, window), 0]  # the window's result and token renewals
+    tickets = itertools.count()
+    totals = {"tokens_minted": 0, "connections_opened": 0}  # counters at the start of the window
+    started = time.perf_counter()
+    deadline = started + duration
+    rows = []
+
+    def worker():
+        holder = TokenHolder(tokens)
+        while True:
+            scheduled = started + next(tickets) / rate
+            if scheduled >= deadline:
+                return
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            renewals = holder.renewals
+            status = deliver(client, url, next(bodies), holder)
+            latency = time.perf_counter() - scheduled
+            with lock:
+                current[0].record(status, latency)
+                current[1] += holder.renewals - renewals
+
+    senders = [threading.Thread(target=worker, name=f"soak-{index}", daemon=True) for index in range(threads)]
+    for thread in senders:
+        thread.start()
+    file = open(out, "w", newline="", encoding="utf-8") if out else None
+    writer = csv.DictWriter(file, COLUMNS) if file else None
+    if writer:
+        writer.writeheader()
+    try:
+        window_started = started
+        while time.perf_counter() < deadline:
+            time.sleep(min(window, max(deadline - time.perf_counter(), 0)))
+            now = time.perf_counter()
+            with lock:
+                (finished, renewals), current[:] = current, [BenchResult("soak", threads, rate, window), 0]
+            row = window_row(now - started, finished, renewals, now - window_started, tokens, client, totals)
+            totals["tokens_minted"] += row["tokens_minted"]
+            totals["connections_opened"] += row["connections_opened"]
+            window_started = now
+            rows.append(row)
+            if writer:
+                writer.writerow(row)
+                file.flush()  # a soak may be stopped at any point, every finished window stays on disk
+            report(f"{row['at']:8.0f}s {row['throughput']:7.1f} req/s p99={row['p99_ms']:.1f} ms "
+                   f"errors={row['error_rate']:.2%} renewals={row['renewals']} sockets={row['open_sockets']} "
+                   f"rss={row['rss_mb']} MB")
+        for thread in senders:
+            thread.join()
+    finally:
+        if file:
+            file.close()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Soak POST /v1/favorites at a fixed rate and flag drift")
+    parser.add_argument("--rate", type=float, default=RATE, help="Requests per second")
+    parser.add_argument("--duration", type=float, default=DURATION, help="Seconds to run")
+    parser.add_argument("--window", type=float, default=WINDOW, help="Seconds per time-series row")
+    parser.add_argument("--threads", type=int, default=THREADS, help="Sending threads")
+    parser.add_argument("--seed", type=int, help="Seed of the body stream")
+    parser.add_argument("--out", help="CSV file for the time series")
+    settings.add_local_server_argument(parser)
+    args = parser.parse_args()
+
+    bodies = SharedStream(stream_bodies() if args.seed is None else stream_bodies(seed=args.seed))
+    with settings.local_server(args.local_server), settings.client_and_tokens(args.threads) as (client, tokens):
+        rows = run_soak(client, tokens, settings.main_url(), bodies, args.rate, args.duration, args.window,
+                        args.threads, args.out)
+
+    flagged = drift(rows)
+    for column, tau, first, last in flagged:
+        print(f"DRIFT {column}: {first:g} -> {last:g} (tau {tau:.2f})")
+    if len(rows) - WARMUP < MIN_WINDOWS:
+        print(f"{len(rows)} windows are too few to check for drift, {MIN_WINDOWS + WARMUP} are needed")
+    elif not flagged:
+        print(f"No drift over {len(rows)} windows")
+    return 1 if flagged else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
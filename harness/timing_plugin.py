@@ -0,0 +1,145 @@
+"""pytest plugin that times every HTTP call the suite makes.
+
+--timings PATH writes one CSV row per request (connect, time to first byte and
+total in milliseconds, status and body sizes), tagged with the test id, its
+parameters and the phase. --timings-baseline PATH compares the run with a
+previous file and reports tests whose median total time regressed.
+"""
+import csv
+import statistics
+import threading
+
+import pytest
+
+from harness.token_broker import THREAD_NAME as BROKER_THREAD
+
+COLUMNS = ("test", "param", "phase", "path", "status", "connect_ms", "ttfb_ms", "total_ms",
+           "request_bytes", "response_bytes")
+THRESHOLD = 1.5  # current median / baseline median
+MIN_DELTA_MS = 5.0  # ignore regressions smaller than this, they are noise on a loopback
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("timings", "per-request timing")
+    group.addoption("--timings", metavar="PATH", help="Write the timing of every HTTP call to this CSV file")
+    group.addoption("--timings-baseline", metavar="PATH", help="Flag tests that got slower than in this CSV file")
+    group.addoption("--timings-threshold", type=float, default=THRESHOLD,
+                    help="Slowdown ratio of the median total time that counts as a regression")
+    group.addoption("--timings-min-delta", type=float, default=MIN_DELTA_MS,
+                    help="Smallest slowdown in milliseconds that counts as a regression")
+
+
+class TimingRecorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rows = []
+        self.test = ""
+        self.param = ""
+        self.phase = ""
+
+    def start(self, item, phase):
+        # The node id depends on the rootdir, which depends on the paths passed to pytest, so keep only the file name
+        self.test = "::".join([item.path.name] + item.nodeid.split("::")[1:])
+        callspec = getattr(item, "callspec", None)
+        self.param = "" if callspec is None else ",".join(f"{name}={value!r}"[:60]
+                                                          for name, value in callspec.params.items())
+        self.phase = phase
+
+    def record(self, record):
+        # Requests from the token broker's thread belong to no test; racers and sweep workers belong to the running one
+        own = threading.current_thread().name != BROKER_THREAD
+        row = {
+            "test": self.test if own else BROKER_THREAD,
+            "param": self.param if own else "",
+            "phase": self.phase if own else "background",
+            "path": record["path"],
+            "status": record["status"],
+            "connect_ms": f"{record['connect'] * 1000:.3f}",
+            "ttfb_ms": f"{record['ttfb'] * 1000:.3f}",
+            "total_ms": f"{record['total'] * 1000:.3f}",
+            "request_bytes": record["request_bytes"],
+            "response_bytes": record["response_bytes"]
+        }
+        with self.lock:
+            self.rows.append(row)
+
+    def write(self, path):
+        with open(path, "w", newline="", encoding="utf-8") as file:
+            writer = csv.DictWriter(file, COLUMNS)
+            writer.writeheader()
+            writer.writerows(self.rows)
+
+
+def read_timings(path):
+    with open(path, newline="", encoding="utf-8") as file:
+        return list(csv.DictReader(file))
+
+
+def median_totals(rows):
+    totals = {}
+    for row in rows:
+        if row["phase"] != "background":
+            totals.setdefault(row["test"], []).append(float(row["total_ms"]))
+    return {test: statistics.median(values) for test, values in totals.items()}
+
+
+def find_regressions(rows, baseline_rows, threshold=THRESHOLD, min_delta=MIN_DELTA_MS):
+    """(test, baseline ms, current ms) for every test whose median total time regressed."""
+    baseline = median_totals(baseline_rows)
+    regressions = []
+    for test, current in median_totals(rows).items():
+        before = baseline.get(test)
+        if before is not None and current > before * threshold and current - before >= min_delta:
+            regressions.append((test, before, current))
+    return sorted(regressions, key=lambda regression: regression[2] - regression[1], reverse=True)
+
+
+def pytest_configure(config):
+    enabled = config.getoption("--timings") or config.getoption("--timings-baseline")
+    config.timing_recorder = TimingRecorder() if enabled else None
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _timing_observer(request):
+    recorder = request.config.timing_recorder
+    if recorder is None:
+        yield
+        return
+    client = request.getfixturevalue("http_client")
+    client.observers.append(recorder.record)
+    yield
+    client.observers.remove(recorder.record)
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_setup(item):
+    if item.config.timing_recorder is not None:
+        item.config.timing_recorder.start(item, "setup")
+    yield
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+    if item.config.timing_recorder is not None:
+        item.config.timing_recorder.start(item, "call")
+    yield
+
+
+def pytest_sessionfinish(session):
+    recorder = session.config.timing_recorder
+    if recorder is not None and session.config.getoption("--timings"):
+        recorder.write(session.config.getoption("--timings"))
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    recorder = config.timing_recorder
+    baseline_path = config.getoption("--timings-baseline")
+    if recorder is None or not baseline_path:
+        return
+    regressions = find_regressions(recorder.rows, read_timings(baseline_path),
+                                   config.getoption("--timings-threshold"), config.getoption("--timings-min-delta"))
+    terminalreporter.write_sep("-", f"timing regressions against {baseline_path}")
+    if not regressions:
+        terminalreporter.write_line("none")
+    for test, before, current in regressions:
+        terminalreporter.write_line(f"{test}: {before:.1f} ms -> {current:.1f} ms (x{current / before:.2f})")
@@ -0,0 +1,133 @@
+"""Hands out auth tokens that a background thread mints ahead of time.
+
+The server forgets a token about two seconds after it was issued or last used
+(see the exceeding_lifetime_of_token case), so tokens are kept warm in a small pool
+and retired before they get too old to be useful for a test.
+"""
+import threading
+from collections import deque
+
+from harness.clock import RealClock
+
+TOKEN_LIFETIME = 2.0  # seconds
+POOL_SIZE = 4
+AUTH_METHOD = "/v1/auth/tokens"
+INVALID_TOKEN = "absolutelyunrealtoken"
+THREAD_NAME = "token-broker"
+
+
+class TokenError(Exception):
+    pass
+
+
+class TokenBroker:
+    def __init__(self, client, main_url, lifetime=TOKEN_LIFETIME, pool_size=POOL_SIZE, min_remaining=None,
+                 clock=None):
+        self.client = client
+        self.main_url = main_url
+        self.lifetime = lifetime
+        self.pool_size = pool_size
+        self.min_remaining = lifetime / 2 if min_remaining is None else min_remaining
+        self.clock = clock or RealClock()
+        self.condition = threading.Condition()
+        self.pool = deque()  # (token, minted_at, answered_at), oldest first
+        self.retired = deque(maxlen=pool_size)
+        self.stopped = False
+        self.last_error = None
+        self.minted = 0
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._refill, name=THREAD_NAME, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+
+    def remaining(self, minted_at):
+        return self.lifetime - (self.clock.monotonic() - minted_at)
+
+    def mint(self):
+        minted_at = self.clock.monotonic()  # taken before the request, so the remaining life is never overestimated
+        response = self.client.post(self.main_url + AUTH_METHOD)
+        # and after it, so the time the token is gone by is never underestimated either
+        answered_at = self.clock.monotonic()
+        if "token" not in response.cookies:
+            raise TokenError("There is not token in the response")
+        with self.condition:
+            self.minted += 1
+        return response.cookies["token"], minted_at, answered_at
+
+    def acquire(self, min_remaining=None):
+        """Cookies with a token that stays valid for at least min_remaining seconds."""
+        min_remaining = self.min_remaining if min_remaining is None else min_remaining
+        with self.condition:
+            self._retire()
+            while self.pool:
+                token, minted_at, answered_at = self.pool.popleft()
+                if self.remaining(minted_at) >= min_remaining:
+                    self.condition.notify_all()
+                    return {"token": token}
+                self.retired.append((token, minted_at, answered_at))
+            self.condition.notify_all()
+        # The pool ran dry or holds nothing young enough, so the caller pays for one inline request
+        try:
+            token, _, _ = self.mint()
+        except Exception as error:
+            with self.condition:
+                refill_error = self.last_error
+            # When the background refill fails as well, its error is shown as the cause
+            raise error from refill_error
+        return {"token": token}
+
+    def expired(self):
+        """Cookies with a token the server has already forgotten."""
+        with self.condition:
+            if self.retired:
+                token, _, answered_at = self.retired.popleft()
+            else:
+                token, answered_at = None, None
+        if token is None:
+            token, _, answered_at = self.mint()
+        # Counted from the answer: the server may have issued the token as late as that, e.g. when another
+        # thread moved the shared clock while the request was in flight
+        wait = self.remaining(answered_at) + self.lifetime / 10
+        if wait > 0:
+            self.clock.sleep(wait)
+        return {"token": token}
+
+    def invalid(self):
+        return {"token": INVALID_TOKEN}
+
+    def missing(self):
+        return {}
+
+    def _retire(self):
+        while self.pool and self.remaining(self.pool[0][1]) < self.min_remaining:
+            self.retired.append(self.pool.popleft())
+
+    def _refill(self):
+        while True:
+            with self.condition:
+                self._retire()
+                while not self.stopped and len(self.pool) >= self.pool_size:
+                    # Wake up when the oldest token has to be retired or a consumer took one
+                    self.condition.wait(max(self.remaining(self.pool[0][1]) - self.min_remaining, 0.01))
+                    self._retire()
+                if self.stopped:
+                    return
+            try:
+                token = self.mint()
+            except Exception as error:  # a background thread has nobody to raise to, acquire() retries inline
+                with self.condition:
+                    self.last_error = error
+                    self.condition.wait(self.lifetime / 4)
+                continue
+            with self.condition:
+                self.pool.append(token)
+                self.last_error = None
@@ -0,0 +1,120 @@
+"""Parse-once wrapper and precompiled schemas for /v1/favorites responses.
+
+The body is decoded exactly once, and every check collects its mismatch instead
+of stopping at the first one, so a single assert reports everything that is wrong.
+"""
+import json
+
+NUMBER = (int, float)
+FAVORITE_FIELDS = {
+    "id": (int,),
+    "title": (str,),
+    "lat": NUMBER,
+    "lon": NUMBER,
+    "color": (str, type(None)),
+    "created_at": (str,)
+}
+ERROR_FIELDS = {
+    "error": {
+        "message": (str,)
+    }
+}
+
+
+def compile_schema(fields, path=()):
+    """Flattens a nested {name: types} description into a list of checks run without recursion."""
+    checks = []
+    for name, spec in fields.items():
+        field_path = path + (name,)
+        if isinstance(spec, dict):
+            checks.append(_field_check(field_path, (dict,)))
+            checks.extend(compile_schema(spec, field_path))
+        else:
+            checks.append(_field_check(field_path, spec))
+    return checks
+
+
+def _field_check(path, types):
+    parent, name = path[:-1], path[-1]
+    label = ".".join(path)
+    type_names = " or ".join("null" if kind is type(None) else kind.__name__ for kind in types)
+    # bool is an int subclass, but a JSON true is never a valid id or coordinate
+    allow_bool = bool in types
+
+    def check(body, problems):
+        node = body
+        for key in parent:
+            if not isinstance(node, dict) or key not in node:
+                return  # the missing parent has already been reported
+            node = node[key]
+        if not isinstance(node, dict) or name not in node:
+            problems.append(f"The '{label}' field is missed")
+            return
+        value = node[name]
+        if not isinstance(value, types) or (isinstance(value, bool) and not allow_bool):
+            problems.append(f"The '{label}' value {value!r} is not {type_names}")
+
+    return check
+
+
+FAVORITE_SCHEMA = compile_schema(FAVORITE_FIELDS)
+ERROR_SCHEMA = compile_schema(ERROR_FIELDS)
+
+
+class ApiResponse:
+    def __init__(self, response):
+        self.response = response
+        self.status_code = response.status_code
+        try:
+            self.body = json.loads(response.content)
+        except ValueError:
+            self.body = None
+
+    @property
+    def text(self):
+        # Decoded only for the messages about a body that isn't JSON
+        return self.response.text
+
+    @property
+    def message(self):
+        try:
+            return self.body["error"]["message"]
+        except (KeyError, TypeError):
+            return None
+
+    def validate(self, schema):
+        if self.body is None:
+            return [f"Response is not in JSON format. Response text is '{self.text}'"]
+        problems = []
+        for check in schema:
+            check(self.body, problems)
+        return problems
+
+    def favorite_problems(self, status=200, **expected):
+        problems = [] if self.status_code == status else [f"Unexpected status code {self.status_code}"]
+        schema_problems = self.validate(FAVORITE_SCHEMA)
+        problems += schema_problems
+        if not isinstance(self.body, dict):
+            return problems
+        if isinstance(self.body.get("id"), int) and self.body["id"] <= 0:
+            problems.append("The 'id' value is less than 0")
+        for name, value in expected.items():
+            if name in self.body and self.body[name] != value:
+                if value is None:
+                    problems.append(f"The '{name}' value is not equal to None")
+                else:
+                    problems.append(f"The '{name}' value is not equal to requests")
+        return problems
+
+    def error_problems(self, status, message):
+        problems = [] if self.status_code == status else [f"Unexpected status code {self.status_code}"]
+        if isinstance(self.body, dict) and "error" not in self.body:
+            return problems + ["There is no 'error' for a wrong request"]
+        problems += self.validate(ERROR_SCHEMA)
+        if isinstance(self.message, str) and message not in self.message:
+            problems.append("There is not correct 'message'")
+        return problems
+
+    def assert_favorite(self, status=200, **expected):
+        problems = self.favorite_problems(status, **expected)
+        assert not problems, "; ".join(problems)
@@ -0,0 +1,59 @@
+import hashlib
+
+import requests
+
+from harness.cassette import CassetteReader, CassetteWriter, request_key
+
+
+def digest(name):
+    return hashlib.blake2b(name.encode("utf-8"), digest_size=16).digest()
+
+
+def write_cassette(directory, recorded):
+    """recorded: (name, body) pairs in the order they were sent."""
+    writer = CassetteWriter(directory)
+    for name, body in recorded:
+        writer.add(digest(name), 200, "OK", [("Content-Type", "application/json")], body)
+    writer.close()
+    return CassetteReader(directory)
+
+
+def test_find_locates_every_entry(tmp_path):
+    names = [f"request-{index}" for index in range(50)]
+    reader = write_cassette(tmp_path, [(name, b"") for name in names for _ in range(3)])
+    try:
+        for name in names:
+            for occurrence in range(3):
+                position = reader.find(digest(name), occurrence)
+                assert reader.entry(position)[:2] == (digest(name), occurrence)
+    finally:
+        reader.close()
+
+
+def test_next_response_follows_the_recorded_order_per_key(tmp_path):
+    reader = write_cassette(tmp_path, [("a", b"a0"), ("b", b"b0"), ("a", b"a1")])
+    try:
+        assert bytes(reader.next_response(digest("b"))[1]) == b"b0"
+        assert bytes(reader.next_response(digest("a"))[1]) == b"a0"
+        assert bytes(reader.next_response(digest("a"))[1]) == b"a1"
+    finally:
+        reader.close()
+
+
+def test_unrecorded_occurrence_is_a_miss_unless_the_last_one_may_repeat(tmp_path):
+    reader = write_cassette(tmp_path, [("token", b"t0"), ("token", b"t1"), ("other", b"o0")])
+    try:
+        assert reader.find(digest("token"), 2) is None
+        assert reader.entry(reader.find(digest("token"), 2, repeat_last=True))[1] == 1
+        reader.next_response(digest("token"))
+        reader.next_response(digest("token"))
+        assert bytes(reader.next_response(digest("token"), repeat_last=True)[1]) == b"t1"
+        assert reader.find(digest("never"), 0, repeat_last=True) is None
+    finally:
+        reader.close()
+
+
+def test_request_key_depends_on_the_test():
+    request = requests.Request("POST", "http://host/v1/favorites", data={"title": "T", "lat": 1}).prepare()
+    assert request_key(request, "issued", "suite::test_a") != request_key(request, "issued", "suite::test_b")
+    assert request_key(request, "issued", "suite::test_a") == request_key(request, "issued", "suite::test_a")
@@ -0,0 +1,34 @@
+import numpy as np
+
+from harness.coord_sweep import CATEGORIES, to_ranges
+
+
+def category(name, size):
+    return np.full(size, CATEGORIES.index(name), dtype=np.int8)
+
+
+def test_neighbouring_failures_collapse_into_one_range():
+    values = np.array([0.5, 0.1, 0.4, 0.2, 0.3])
+    failed = np.array([True, False, True, False, True])  # 0.3, 0.4 and 0.5 once sorted
+    assert to_ranges(values, failed, category("decimals", 5)) == [
+        {"category": "decimals", "low": 0.3, "high": 0.5, "count": 3}
+    ]
+
+
+def test_ranges_are_kept_per_category_and_sorted_by_size():
+    values = np.array([1.0, 2.0, 3.0, 4.0, 1e-310, -0.0])
+    failed = np.array([True, False, True, True, True, False])
+    categories = np.concatenate([category("decimals", 4), category("subnormal", 1), category("negative-zero", 1)])
+    assert to_ranges(values, failed, categories) == [
+        {"category": "decimals", "low": 3.0, "high": 4.0, "count": 2},
+        # Ties keep the order of CATEGORIES
+        {"category": "subnormal", "low": 1e-310, "high": 1e-310, "count": 1},
+        {"category": "decimals", "low": 1.0, "high": 1.0, "count": 1}
+    ]
+
+
+def test_ranges_are_limited_and_empty_without_failures():
+    values = np.arange(10, dtype=float)
+    alternate = np.arange(10) % 2 == 0
+    assert len(to_ranges(values, alternate, category("decimals", 10), limit=3)) == 3
+    assert to_ranges(values, np.zeros(10, dtype=bool), category("decimals", 10)) == []
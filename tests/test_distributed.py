@@ -0,0 +1,26 @@
+import pytest
+
+from harness.distributed import jobs, split
+
+
+@pytest.mark.parametrize("total, parts, expected", [
+    (10, 4, [3, 3, 2, 2]),
+    (8, 4, [2, 2, 2, 2]),
+    (3, 3, [1, 1, 1]),
+    (5, 1, [5]),
+    (0, 2, [0, 0])
+])
+def test_split_is_as_even_as_possible(total, parts, expected):
+    assert split(total, parts) == expected
+
+
+def test_jobs_share_the_concurrency_and_rate():
+    shares = jobs(3, "http://host", 10, 5.0, rate=300.0)
+    assert [job["concurrency"] for job in shares] == [4, 3, 3]
+    assert [job["rate"] for job in shares] == [100.0] * 3
+    assert [job["offset"] for job in shares] == [0, 1, 2]
+
+
+def test_jobs_refuse_fewer_threads_than_workers():
+    with pytest.raises(ValueError):
+        jobs(4, "http://host", 3, 5.0)
@@ -0,0 +1,54 @@
+import pytest
+
+from harness.histogram import PRECISION, LatencyHistogram
+
+
+def histogram(*values):
+    result = LatencyHistogram()
+    for seconds in values:
+        result.record(seconds)
+    return result
+
+
+def test_bucket_bounds_a_value_within_the_precision():
+    for seconds in (0.000002, 0.0001, 0.0123, 0.5, 7.0):
+        upper = 1.01 ** LatencyHistogram.bucket(seconds) / 1e6
+        assert seconds <= upper * (1 + 1e-12)
+        assert upper <= seconds * (1 + PRECISION)
+
+
+def test_sub_microsecond_values_share_the_first_bucket():
+    assert LatencyHistogram.bucket(0.0) == LatencyHistogram.bucket(0.0000005) == 0
+
+
+def test_percentile_is_within_the_precision_and_never_above_max():
+    result = histogram(*(index / 1000 for index in range(1, 101)))  # 1 ms .. 100 ms
+    assert result.percentile(50) == pytest.approx(0.050, rel=PRECISION)
+    assert result.percentile(90) == pytest.approx(0.090, rel=PRECISION)
+    assert result.percentile(100) == result.max == 0.1
+    assert LatencyHistogram().percentile(99) == 0.0
+
+
+def test_merge_equals_recording_everything_in_one():
+    merged = histogram(0.001, 0.002).merge(histogram(0.003, 0.0005))
+    whole = histogram(0.001, 0.002, 0.003, 0.0005)
+    assert merged.counts == whole.counts
+    assert (merged.count, merged.min, merged.max) == (4, 0.0005, 0.003)
+    assert merged.total == pytest.approx(whole.total)
+    assert merged.summary() == pytest.approx(whole.summary())
+
+
+def test_to_dict_round_trip():
+    original = histogram(0.001, 0.01, 0.01, 0.1)
+    restored = LatencyHistogram.from_dict(original.to_dict())
+    assert restored.counts == original.counts
+    assert restored.summary() == original.summary()
+    empty = LatencyHistogram.from_dict(LatencyHistogram().to_dict())
+    assert empty.summary() == LatencyHistogram().summary()
+
+
+def test_from_dict_refuses_another_precision():
+    data = histogram(0.001).to_dict()
+    data["precision"] = PRECISION * 2
+    with pytest.raises(ValueError):
+        LatencyHistogram.from_dict(data)
@@ -0,0 +1,10 @@
+from harness.race import SERIAL_RATIO, serial_ratio
+
+
+def test_calls_queued_one_behind_another_are_serialised():
+    assert serial_ratio([0.010, 0.020, 0.030, 0.040], 0.010) > SERIAL_RATIO
+
+
+def test_one_straggler_is_not_serialisation():
+    assert serial_ratio([0.010, 0.011, 0.012, 0.040], 0.010) < SERIAL_RATIO
+    assert serial_ratio([0.010] * 15 + [0.160], 0.010) < SERIAL_RATIO
@@ -0,0 +1,43 @@
+import pytest
+
+from harness.soak import MIN_WINDOWS, WATCHED, WARMUP, drift, kendall_tau
+
+
+def test_kendall_tau_of_monotonic_and_flat_series():
+    assert kendall_tau([1, 2, 3, 4, 5]) == 1.0
+    assert kendall_tau([5, 4, 3, 2, 1]) == -1.0
+    assert kendall_tau([3, 3, 3, 3]) == 0.0
+    assert kendall_tau([1, 2]) == 0.0  # too few to call
+
+
+def test_kendall_tau_counts_discordant_pairs():
+    # Pairs (1,3) (1,2) (3,2): concordant, concordant, discordant
+    assert kendall_tau([1, 3, 2]) == pytest.approx(1 / 3)
+
+
+def rows(series, column="rss_mb"):
+    """Soak rows with the column following series and every other watched column flat."""
+    return [{name: (value if name == column else 1.0) for name in WATCHED} for value in series]
+
+
+def test_drift_flags_a_steady_large_rise():
+    series = [100 + 10 * index for index in range(WARMUP + MIN_WINDOWS)]
+    [(column, tau, first, last)] = drift(rows(series))
+    assert column == "rss_mb" and tau == 1.0 and last > first
+
+
+def test_drift_leaves_a_small_rise_and_noise_alone():
+    count = WARMUP + MIN_WINDOWS
+    assert drift(rows([100 + 0.1 * index for index in range(count)])) == []  # steady but within the growth threshold
+    assert drift(rows([100, 300] * (count // 2))) == []  # large but not steady
+
+
+def test_drift_skips_the_warmup_and_short_series():
+    series = [1000] + [100 + 10 * index for index in range(MIN_WINDOWS)]
+    assert [column for column, *_ in drift(rows(series))] == ["rss_mb"]
+    assert drift(rows([100 + 10 * index for index in range(WARMUP + MIN_WINDOWS - 1)])) == []
+
+
+def test_drift_ignores_missing_samples():
+    series = [None if index % 3 == 0 else 100 + 10 * index for index in range(WARMUP + MIN_WINDOWS * 2)]
+    assert [column for column, *_ in drift(rows(series))] == ["rss_mb"]